@@ -0,0 +1,77 @@
+"""Benchmark of the speech JSON to transcript conversion in common/transcripts.py.
+
+Compares the streaming converter with the original one (whole document in
+memory, quadratic appends) on a synthetic multi-hour output:
+
+    python -m benchmarks.transcripts --hours 3
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from common.transcripts import format_transcript, iter_tokens
+
+
+def _legacy_transcript(json_data):
+    """The original conversion (whole document in memory, quadratic appends), for the benchmark."""
+    transcript = ""
+    for entry in json_data["transcriptions"][0]["tokens"]:
+        transcript += f"{entry['token']} "
+    return transcript
+
+
+def _write_synthetic_output(path, hours, speakers=3, words_per_minute=150):
+    """Writes a speech JSON output of the given length in the service's format."""
+    words = "the of and to a in that is was he for it with as his on be at by".split()
+    rng = random.Random(0)
+    count = int(hours * 60 * words_per_minute)
+    step = 60 / words_per_minute
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"status": "SUCCESS", "transcriptions": [{"transcription": "", "tokens": [')
+        speaker = 0
+        for i in range(count):
+            if rng.random() < 0.02:
+                speaker = rng.randrange(speakers)
+            token = {
+                "token": rng.choice(words), "startTime": f"{i * step:.3f}s", "endTime": f"{(i + 1) * step:.3f}s",
+                "confidence": "0.95", "speakerIndex": speaker,
+            }
+            f.write(("," if i else "") + json.dumps(token))
+        f.write("]}]}")
+    return count
+
+
+def run(hours):
+    """Compares the streaming converter with the original one on a synthetic output."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "speech.json")
+        count = _write_synthetic_output(path, hours)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"{hours} h output: {count} tokens, {size_mb:.1f} MB")
+
+        def measure(name, convert):
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                convert(f)
+            seconds = time.perf_counter() - start
+            # Memory is traced in a second run, tracing slows the conversion down
+            tracemalloc.start()
+            with open(path, "rb") as f:
+                convert(f)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+            print(f"{name:>9}: {seconds:6.2f} s, {count / seconds:9.0f} tokens/s, "
+                  f"{size_mb / seconds:5.1f} MB/s, peak memory {peak_mb:6.1f} MB")
+
+        measure("original", lambda f: _legacy_transcript(json.load(f)))
+        measure("streaming", lambda f: format_transcript(iter_tokens(f)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the speech JSON to transcript conversion.")
+    parser.add_argument("--hours", type=float, default=3, help="length of the synthetic recording")
+    run(parser.parse_args().hours)
@@ -0,0 +1,59 @@
+"""Helpers for talking to Generative AI Agents endpoints."""
+import collections
+import json
+import time
+
+import genai_agent_service_bmc_python_client
+
+Citation = collections.namedtuple("Citation", ["source_text", "url"])
+
+
+def _citation_from_model(citation):
+    return Citation(citation.source_text, citation.source_location.url)
+
+
+def _citation_from_event(citation):
+    location = citation.get("sourceLocation") or {}
+    return Citation(citation.get("sourceText"), location.get("url"))
+
+
+def stream_execute(client, agent_endpoint_id, session_id, user_message, stats=None):
+    """Executes one message and yields `(text_delta, citations)` as they arrive.
+
+    `citations` is None until the runtime delivers them. When `stats` is a dict
+    it receives `ttft` (seconds to the first text) and `total` (seconds to the
+    end of the stream).
+    """
+    start = time.perf_counter()
+    execute_session_details = genai_agent_service_bmc_python_client.models.ExecuteSessionDetails(
+        user_message=str(user_message), should_stream=True
+    )
+    response = client.execute_session(agent_endpoint_id, session_id, execute_session_details)
+
+    def first_token():
+        if stats is not None and "ttft" not in stats:
+            stats["ttft"] = time.perf_counter() - start
+
+    if hasattr(response.data, "events"):
+        text = ""
+        for event in response.data.events():
+            if not event.data:
+                continue
+            payload = json.loads(event.data)
+            content = (payload.get("message") or {}).get("content") or {}
+            chunk = content.get("text") or ""
+            # Events carry either the text so far or just the new part
+            delta = chunk[len(text):] if chunk.startswith(text) else chunk
+            citations = content.get("citations")
+            if delta:
+                first_token()
+                text += delta
+            if delta or citations:
+                yield delta, [_citation_from_event(c) for c in citations] if citations else None
+    else:
+        # The endpoint answered without streaming
+        content = response.data.message.content
+        first_token()
+        yield content.text, [_citation_from_model(c) for c in content.citations or []]
+    if stats is not None:
+        stats["total"] = time.perf_counter() - start
@@ -0,0 +1,183 @@
+"""Latency-aware routing across several agent endpoints.
+
+The router keeps an exponentially weighted moving average (EWMA) of time to
+first token and of the error rate for every endpoint, probes endpoints in the
+background, sends new chats to the healthiest one and fails a message over to
+the next best endpoint when execution errors.
+"""
+import random
+import threading
+import time
+
+from common.agent_sessions import IDLE_TIMEOUT, get_session_pool
+
+ALPHA = 0.3  # weight of the newest sample in the moving averages
+ERROR_PENALTY = 5  # a 100% error rate counts like 6x the latency
+UNHEALTHY_AFTER = 3  # consecutive failures before an endpoint is skipped
+PROBE_INTERVAL = 60
+
+
+def _ewma(current, sample):
+    return sample if current is None else ALPHA * sample + (1 - ALPHA) * current
+
+
+class EndpointStats:
+    def __init__(self, name, agent_endpoint_id):
+        self.name = name
+        self.agent_endpoint_id = agent_endpoint_id
+        self.latency = None  # EWMA of time to first token, seconds
+        self.probe_latency = None  # EWMA of probe round-trips, seconds
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    @property
+    def healthy(self):
+        return self.consecutive_failures < UNHEALTHY_AFTER
+
+    def score(self):
+        """Lower is better; endpoints without traffic yet score on their probes."""
+        latency = self.latency if self.latency is not None else self.probe_latency
+        return (latency or 0.0) * (1 + ERROR_PENALTY * self.error_rate)
+
+
+class AgentRouter:
+    def __init__(self, client, endpoints, idle_timeout=IDLE_TIMEOUT, probe_interval=PROBE_INTERVAL):
+        """`endpoints` maps display names to agent endpoint OCIDs."""
+        self.client = client
+        self.endpoints = dict(endpoints)
+        self.idle_timeout = idle_timeout
+        self._stats = {name: EndpointStats(name, ocid) for name, ocid in self.endpoints.items()}
+        self._lock = threading.Lock()
+        self.probe_interval = probe_interval
+        threading.Thread(target=self._probe_loop, daemon=True, name="agent-router-probe").start()
+
+    def pool(self, name):
+        return get_session_pool(self.client, self.endpoints[name], idle_timeout=self.idle_timeout)
+
+    def name_for(self, agent_endpoint_id):
+        for name, ocid in self.endpoints.items():
+            if ocid == agent_endpoint_id:
+                return name
+        return None
+
+    def record(self, name, latency=None, error=None, probe=False):
+        with self._lock:
+            stats = self._stats[name]
+            if error is not None:
+                stats.consecutive_failures += 1
+                stats.last_error = str(error)[:200]
+            else:
+                stats.consecutive_failures = 0
+            if probe:
+                if latency is not None:
+                    stats.probe_latency = _ewma(stats.probe_latency, latency)
+                return
+            stats.requests += 1
+            stats.errors += error is not None
+            stats.error_rate = _ewma(stats.error_rate, 1.0 if error is not None else 0.0)
+            if latency is not None:
+                stats.latency = _ewma(stats.latency, latency)
+
+    def choose(self, exclude=()):
+        """Returns the name of the healthiest endpoint, ties broken at random."""
+        with self._lock:
+            candidates = [s for s in self._stats.values() if s.name not in exclude]
+            healthy = [s for s in candidates if s.healthy] or candidates
+            if not healthy:
+                return None
+            best = min(s.score() for s in healthy)
+            return random.choice([s.name for s in healthy if s.score() == best])
+
+    def acquire(self, name=None):
+        """Returns a pre-warmed session on `name`, or on the best endpoint."""
+        return self.pool(name or self.choose()).acquire()
+
+    def execute(self, session, user_message, stats=None):
+        """Streams the answer on the session's endpoint, failing over on errors.
+
+        Failover only happens before the first token arrives; `session` is moved
+        to the new endpoint so the rest of the chat stays there. Errors after the
+        first token are recorded and re-raised.
+        """
+        tried = []
+        while True:
+            name = self.name_for(session.agent_endpoint_id)
+            tried.append(name)
+            attempt = {}
+            try:
+                events = self.pool(name).execute(session, user_message, attempt)
+                first = next(events, None)
+            except Exception as e:
+                self.record(name, error=e)
+                fallback = self.choose(exclude=tried)
+                if fallback is None:
+                    raise
+                print(f"Agent endpoint {name} failed ({e}), failing over to {fallback}")
+                fresh = self.pool(fallback).acquire()
+                session.id = fresh.id
+                session.agent_endpoint_id = fresh.agent_endpoint_id
+                session.last_used = fresh.last_used
+                continue
+            break
+        try:
+            if first is not None:
+                yield first
+            yield from events
+        except Exception as e:
+            # Too late to fail over, but the endpoint's score must still reflect it
+            self.record(name, error=e)
+            raise
+        self.record(name, latency=attempt.get("ttft", attempt.get("total")))
+        if stats is not None:
+            stats.update(attempt)
+
+    def _probe_loop(self):
+        while True:
+            for name in list(self.endpoints):
+                self.probe(name)
+            time.sleep(self.probe_interval)
+
+    def probe(self, name):
+        """Times a `get_session` on one of the endpoint's ready sessions."""
+        pool = self.pool(name)
+        session_id = pool.peek()
+        if session_id is None:
+            return  # the pool is still warming up (its failures show up as execute errors)
+        start = time.perf_counter()
+        try:
+            self.client.get_session(self.endpoints[name], session_id)
+        except Exception as e:
+            self.record(name, error=e, probe=True)
+        else:
+            self.record(name, latency=time.perf_counter() - start, probe=True)
+
+    def stats(self):
+        """One row per endpoint for display."""
+        with self._lock:
+            rows = list(self._stats.values())
+        return [{
+            "endpoint": s.name,
+            "healthy": s.healthy,
+            "ttft ewma (s)": None if s.latency is None else round(s.latency, 2),
+            "probe ewma (ms)": None if s.probe_latency is None else round(s.probe_latency * 1000),
+            "error rate": round(s.error_rate, 2),
+            "requests": s.requests,
+            "errors": s.errors,
+            "ready sessions": self.pool(s.name).stats()["ready"],
+        } for s in rows]
+
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(client, endpoints, idle_timeout=IDLE_TIMEOUT):
+    """Returns the process-wide router for this set of endpoints."""
+    key = tuple(sorted(endpoints.items()))
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = AgentRouter(client, endpoints, idle_timeout)
+        return _routers[key]
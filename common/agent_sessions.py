@@ -0,0 +1,147 @@
+"""Pre-warmed Generative AI Agents sessions.
+
+Each agent endpoint gets a small pool of sessions created in the background, so
+a new chat does not wait for `create_session`. Idle sessions are replaced
+before they time out, and a chat whose session expired gets a new one
+transparently on the next message.
+"""
+import threading
+import time
+
+import oci
+import genai_agent_service_bmc_python_client
+
+from common.agent import stream_execute
+
+POOL_SIZE = 2  # sessions kept ready per endpoint
+IDLE_TIMEOUT = 3600  # seconds a session may sit idle before the service ends it
+REFRESH_MARGIN = 120  # replace sessions this many seconds before they expire
+MAINTENANCE_INTERVAL = 30
+MAX_BACKOFF = 300  # longest wait between maintenance passes after errors
+
+
+class AgentSession:
+    """An agent session and the local estimate of when it expires."""
+
+    def __init__(self, session_id, welcome_message, idle_timeout, agent_endpoint_id=None):
+        self.id = session_id
+        self.agent_endpoint_id = agent_endpoint_id
+        self.welcome_message = welcome_message
+        self.idle_timeout = idle_timeout
+        self.last_used = time.monotonic()
+
+    def expires_in(self):
+        return self.last_used + self.idle_timeout - time.monotonic()
+
+
+class AgentSessionPool:
+    """Keeps `size` fresh sessions ready for one agent endpoint."""
+
+    def __init__(self, client, agent_endpoint_id, size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT):
+        self.client = client
+        self.agent_endpoint_id = agent_endpoint_id
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.created = 0
+        self.recreated = 0
+        self._ready = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._maintain, daemon=True,
+                         name=f"agent-sessions-{agent_endpoint_id[-8:]}").start()
+
+    def _create(self):
+        create_session_details = genai_agent_service_bmc_python_client.models.CreateSessionDetails(
+            display_name="display_name", idle_timeout_in_seconds=self.idle_timeout, description="description"
+        )
+        response = self.client.create_session(create_session_details, self.agent_endpoint_id)
+        self.created += 1
+        return AgentSession(response.data.id, getattr(response.data, "welcome_message", None),
+                            self.idle_timeout, self.agent_endpoint_id)
+
+    def _maintain(self):
+        delay = MAINTENANCE_INTERVAL
+        while True:
+            try:
+                self._refill()
+                delay = MAINTENANCE_INTERVAL
+            except Exception as e:  # network errors and timeouts must not end the thread
+                print(f"Error pre-creating agent session for {self.agent_endpoint_id}: {e}")
+                delay = min(delay * 2, MAX_BACKOFF)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _refill(self):
+        with self._lock:
+            # Drop sessions that would expire soon, then top the pool up
+            self._ready = [s for s in self._ready if s.expires_in() > REFRESH_MARGIN]
+            missing = self.size - len(self._ready)
+        for _ in range(missing):
+            session = self._create()
+            with self._lock:
+                self._ready.append(session)
+
+    def acquire(self):
+        """Hands out a ready session, creating one if the pool is empty."""
+        with self._lock:
+            while self._ready:
+                session = self._ready.pop(0)
+                if session.expires_in() > REFRESH_MARGIN:
+                    break
+            else:
+                session = None
+        self._wake.set()  # refill in the background
+        if session is None:
+            session = self._create()
+        session.last_used = time.monotonic()
+        return session
+
+    def peek(self):
+        """Returns the id of a ready session without handing it out, or None."""
+        with self._lock:
+            return self._ready[0].id if self._ready else None
+
+    def _renew(self, session):
+        """Points `session` at a fresh session after the old one expired."""
+        fresh = self.acquire()
+        session.id = fresh.id
+        session.agent_endpoint_id = fresh.agent_endpoint_id
+        session.last_used = fresh.last_used
+        self.recreated += 1
+
+    def execute(self, session, user_message, stats=None):
+        """Streams the answer like `stream_execute`, recreating expired sessions."""
+        if session.expires_in() <= 0:
+            self._renew(session)
+        try:
+            events = stream_execute(self.client, self.agent_endpoint_id, session.id, user_message, stats)
+            first = next(events, None)
+        except oci.exceptions.ServiceError as e:
+            # The service ended the session (idle timeout, restart); retry once on a new one
+            if e.status not in (404, 409) and "session" not in str(e.message).lower():
+                raise
+            self._renew(session)
+            events = stream_execute(self.client, self.agent_endpoint_id, session.id, user_message, stats)
+            first = next(events, None)
+        session.last_used = time.monotonic()
+        if first is not None:
+            yield first
+            yield from events
+        session.last_used = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            ready = len(self._ready)
+        return {"ready": ready, "created": self.created, "recreated": self.recreated}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(client, agent_endpoint_id, size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT):
+    """Returns the process-wide session pool for an agent endpoint."""
+    with _pools_lock:
+        if agent_endpoint_id not in _pools:
+            _pools[agent_endpoint_id] = AgentSessionPool(client, agent_endpoint_id, size, idle_timeout)
+        return _pools[agent_endpoint_id]
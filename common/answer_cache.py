@@ -0,0 +1,148 @@
+"""Answer cache for repetitive RAG questions.
+
+Questions are normalized (case, punctuation, filler words) and looked up
+exactly first, then approximately by word-level cosine similarity, so
+"What is VICAR?" and "what does VICAR mean" share one answer. Numbers, single
+letters, roman numerals and words that negate or contrast ("not", "unless",
+"before", "above", ...) are kept and must match exactly for an approximate
+hit: "section 3553(a)" and "section 3553(b)", "category I" and "category II",
+or "when does it apply" and "when does it not apply" have different answers.
+Entries are scoped per agent endpoint, expire after a TTL and are evicted
+least recently used once the cache is full.
+"""
+import collections
+import math
+import re
+import threading
+import time
+
+MAX_ENTRIES = 500
+TTL = 24 * 60 * 60
+SIMILARITY_THRESHOLD = 0.85  # word-level cosine; one differing word in four is a miss
+
+FILLER_WORDS = {
+    "an", "the", "what", "whats", "is", "are", "was", "does", "do", "did",
+    "mean", "means", "meaning", "of", "please", "tell", "me", "about", "can",
+    "could", "you", "explain", "define", "definition", "describe", "want",
+    "to", "know", "for",
+}
+# Words that flip or bound the meaning of a question; they must match exactly
+EXACT_WORDS = {
+    "not", "no", "nor", "neither", "none", "never", "without", "except", "unless",
+    "before", "after", "above", "below", "over", "under", "less", "fewer", "higher",
+    "lower", "minimum", "maximum", "only", "first", "last",
+}
+ROMAN_NUMERAL = re.compile(r"m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})")
+# Questions with these words refer back to the conversation and are never cached
+CONTEXT_WORDS = {
+    "it", "its", "that", "this", "these", "those", "they", "them", "their",
+    "he", "she", "his", "her", "more", "above", "previous", "again", "else",
+    "also", "same", "another",
+}
+
+CachedAnswer = collections.namedtuple("CachedAnswer", ["text", "citations", "match"])
+
+
+def _words(question):
+    question = question.lower().replace("’", "'").replace("'s", "")
+    question = question.replace("cannot", "can not").replace("n't", " not")
+    return re.findall(r"[a-z0-9]+", question)
+
+
+def is_identifier(word):
+    """Numbers, single letters and roman numerals, e.g. the "3553", "a" and "ii" of a citation."""
+    return len(word) == 1 or any(c.isdigit() for c in word) or bool(ROMAN_NUMERAL.fullmatch(word))
+
+
+def _is_exact(word):
+    return is_identifier(word) or word in EXACT_WORDS
+
+
+def normalize(question):
+    """Returns the question reduced to its content words and identifiers."""
+    return " ".join(w for w in _words(question) if is_identifier(w) or w not in FILLER_WORDS)
+
+
+def is_standalone(question):
+    """False for follow-ups whose answer depends on earlier turns."""
+    return not CONTEXT_WORDS.intersection(_words(question))
+
+
+def _features(normalized):
+    """Identifiers and negations in order, which must match exactly, and the other words without a plural s."""
+    words = normalized.split()
+    exact = tuple(w for w in words if _is_exact(w))
+    terms = collections.Counter(w[:-1] if len(w) > 3 and w.endswith("s") else w
+                                for w in words if not _is_exact(w))
+    return exact, terms
+
+
+def _cosine(a, b):
+    dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+class AnswerCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL, threshold=SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.exact_hits = 0
+        self.approximate_hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()  # (scope, normalized) -> (text, citations, features, created)
+        self._lock = threading.Lock()
+
+    def get(self, scope, question):
+        """Returns a `CachedAnswer` or None; `match` is "exact" or "approximate"."""
+        key = (scope, normalize(question))
+        if not key[1] or not is_standalone(question):
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            match = "exact"
+            if entry is None:
+                exact, terms = _features(key[1])
+                best, best_score = None, self.threshold
+                for other_key, other in self._entries.items():
+                    if other_key[0] != scope or now - other[3] > self.ttl or other[2][0] != exact:
+                        continue
+                    score = _cosine(terms, other[2][1])
+                    if score >= best_score:
+                        best, best_score = other_key, score
+                key, entry, match = best, self._entries.get(best), "approximate"
+            if entry is None or now - entry[3] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if match == "exact":
+                self.exact_hits += 1
+            else:
+                self.approximate_hits += 1
+            return CachedAnswer(entry[0], entry[1], match)
+
+    def set(self, scope, question, text, citations):
+        normalized = normalize(question)
+        if not normalized or not is_standalone(question):
+            return
+        with self._lock:
+            self._entries[(scope, normalized)] = (text, citations, _features(normalized), time.time())
+            self._entries.move_to_end((scope, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "exact hits": self.exact_hits,
+            "approximate hits": self.approximate_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,110 @@
+"""In-memory index of the objects under a bucket prefix.
+
+Pickers used to call `list_objects` on every rerun and only read the first
+page. The index follows `next_start_with` through every page, keeps name,
+size, etag and time modified per object, and is shared by all sessions. Once
+the TTL has passed, the next reader gets the current snapshot straight away
+while a background thread re-lists the prefix; unchanged entries are kept and
+`version` only moves when an object was added, changed or removed, so callers
+can rebuild derived views only when something changed.
+"""
+import collections
+import threading
+import time
+
+TTL = 60  # seconds before a snapshot is refreshed
+PAGE_SIZE = 1000  # the Object Storage maximum
+
+ObjectInfo = collections.namedtuple("ObjectInfo", ["name", "size", "etag", "time_modified"])
+
+
+class BucketIndex:
+    def __init__(self, client, namespace_name, bucket_name, prefix, ttl=TTL):
+        self.client = client
+        self.namespace_name = namespace_name
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.ttl = ttl
+        self.version = 0
+        self.error = None
+        self._objects = None
+        self._refreshed = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _list(self):
+        objects = {}
+        start = None
+        while True:
+            response = self.client.list_objects(
+                self.namespace_name, self.bucket_name, prefix=self.prefix, start=start,
+                limit=PAGE_SIZE, fields="name,size,etag,timeModified")
+            for obj in response.data.objects:
+                objects[obj.name] = ObjectInfo(obj.name, obj.size, obj.etag, obj.time_modified)
+            start = response.data.next_start_with
+            if not start:
+                return objects
+
+    def refresh(self):
+        """Re-lists the prefix and merges the changes into the index."""
+        try:
+            listed = self._list()
+        except Exception as e:  # network errors too; the next stale read tries again
+            print(f"Error listing {self.prefix} in {self.bucket_name}: {e}")
+            with self._lock:
+                self.error = e
+            return
+        finally:
+            with self._lock:
+                self._refreshing = False
+        with self._lock:
+            current = self._objects or {}
+            if self._objects is None or listed.keys() != current.keys() or any(
+                    current[name].etag != info.etag for name, info in listed.items()):
+                self._objects = listed
+                self.version += 1
+            self.error = None
+            self._refreshed = time.time()
+
+    def invalidate(self, *object_names):
+        """Forces a refresh on the next read, e.g. after writing under the prefix.
+
+        `object_names` just written are added to the snapshot right away, so the
+        next read lists them; their size, ETag and time are filled in by the refresh.
+        """
+        with self._lock:
+            self._refreshed = 0
+            if self._objects is not None and object_names:
+                self._objects = dict(self._objects)
+                for name in object_names:
+                    if name.startswith(self.prefix):
+                        self._objects[name] = ObjectInfo(name, None, None, None)
+                self.version += 1
+
+    def objects(self):
+        """Returns the indexed objects sorted by name; only the first call waits for Object Storage."""
+        with self._lock:
+            loaded = self._objects is not None
+            stale = time.time() - self._refreshed > self.ttl
+            start_refresh = loaded and stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if not loaded:
+            self.refresh()
+        elif start_refresh:
+            threading.Thread(target=self.refresh, daemon=True, name="bucket-index-refresh").start()
+        with self._lock:
+            return sorted((self._objects or {}).values())
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_bucket_index(client, namespace_name, bucket_name, prefix, ttl=TTL):
+    """Returns the process-wide index of one bucket prefix."""
+    key = (namespace_name, bucket_name, prefix)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = BucketIndex(client, namespace_name, bucket_name, prefix, ttl)
+        return _indexes[key]
@@ -0,0 +1,113 @@
+"""Streaming, boundary-aware token chunker.
+
+`iter_chunks` consumes text lazily (PDF pages, transcript pieces, ...) and
+yields chunks of at most `chunk_size` tokens, cut after a sentence or
+paragraph whenever possible. Only the current chunk and the unfinished
+sentence are held in memory.
+
+Cut points are anchored to content: once a chunk holds a minimum number of
+tokens, it ends after the first sentence whose hash marks it as an anchor.
+Whether a sentence is an anchor depends only on its own text, so an edit
+moves at most the cut points next to it, and the chunks after the next anchor
+are the same as before (and hit the summary cache).
+"""
+import functools
+import re
+import zlib
+
+import tiktoken
+
+CHUNK_SIZE = 3000
+MIN_CHUNK = 0.1  # share of chunk_size a chunk holds before it may end at an anchor
+ANCHOR_GAP = 0.3  # average distance between anchors, as a share of chunk_size
+# Sentence ends (., ! or ? followed by whitespace) and paragraph breaks
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n\s*")
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model_name="cl100k_base"):
+    """Returns the tiktoken encoding, loaded once per process."""
+    try:
+        return tiktoken.get_encoding(model_name)
+    except ValueError:
+        print(f"Warning: Model '{model_name}' not found. Using 'cl100k_base'.")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model_name="cl100k_base"):
+    return len(get_encoding(model_name).encode(text))
+
+
+def _split_units(text, pos=0):
+    """Splits text into sentences/paragraphs, keeping the separators.
+
+    Returns the complete units and the trailing text after the last boundary.
+    Boundaries are only searched from `pos` on.
+    """
+    units = []
+    start = 0
+    for match in _BOUNDARY.finditer(text, pos):
+        units.append(text[start:match.end()])
+        start = match.end()
+    return units, text[start:]
+
+
+def is_anchor(unit, tokens, gap):
+    """True for sentences that end a chunk; about one per `gap` tokens of text."""
+    return zlib.crc32(unit.strip().encode("utf-8")) < min(tokens / gap, 1) * 2 ** 32
+
+
+def iter_chunks(texts, chunk_size=CHUNK_SIZE, overlap=0, model_name="cl100k_base"):
+    """Yields chunks of at most `chunk_size` tokens from an iterable of text.
+
+    `overlap` repeats up to that many tokens of trailing sentences from the
+    previous chunk at the start of the next one. Sentences longer than a chunk
+    are split on token boundaries.
+    """
+    encoding = get_encoding(model_name)
+    min_tokens = chunk_size * MIN_CHUNK
+    gap = max(chunk_size * ANCHOR_GAP, 1)
+    chunk_units, chunk_tokens = [], 0
+    has_new = False  # the chunk holds more than the overlap of the previous one
+    pending = ""
+
+    def flush(next_tokens=0):
+        nonlocal chunk_units, chunk_tokens, has_new
+        yield "".join(u for u, _ in chunk_units)
+        kept, kept_tokens = [], 0
+        for u, n in reversed(chunk_units):
+            if kept_tokens + n > overlap or kept_tokens + n + next_tokens > chunk_size:
+                break
+            kept.insert(0, (u, n))
+            kept_tokens += n
+        chunk_units, chunk_tokens, has_new = kept, kept_tokens, False
+
+    def add(unit):
+        nonlocal chunk_tokens, has_new
+        tokens = encoding.encode(unit)
+        if len(tokens) > chunk_size:
+            # A single sentence that does not fit: hard split it on tokens
+            for i in range(0, len(tokens), chunk_size):
+                yield from add(encoding.decode(tokens[i:i + chunk_size]))
+            return
+        if chunk_units and chunk_tokens + len(tokens) > chunk_size:
+            yield from flush(len(tokens))  # no anchor in time; cut where the chunk is full
+        chunk_units.append((unit, len(tokens)))
+        chunk_tokens += len(tokens)
+        has_new = True
+        if chunk_tokens >= min_tokens and is_anchor(unit, len(tokens), gap):
+            yield from flush()
+
+    for text in texts:
+        # Only the new text (and the whitespace before it) can hold a new boundary
+        units, pending = _split_units(pending + text, len(pending.rstrip()))
+        for unit in units:
+            yield from add(unit)
+        # No boundary for a long stretch (e.g. unpunctuated speech): flush it
+        if len(pending) > chunk_size * 8:
+            yield from add(pending)
+            pending = ""
+    if pending:
+        yield from add(pending)
+    if has_new:
+        yield "".join(u for u, _ in chunk_units)
@@ -0,0 +1,106 @@
+"""Pre-authenticated request (PAR) links for agent citations.
+
+Citations are deduplicated by object, PAR URLs are reused until shortly
+before they expire, and the remaining PARs are created concurrently, so the
+citation block costs at most one Object Storage round-trip however many
+citations an answer has.
+"""
+import collections
+import concurrent.futures
+import datetime
+import threading
+from urllib.parse import unquote, urlparse
+
+import pytz
+from oci.object_storage.models import CreatePreauthenticatedRequestDetails
+
+from common.clients import get_object_storage_client
+
+PAR_LIFETIME = datetime.timedelta(minutes=5)  # adjust as necessary for your security needs
+REUSE_MARGIN = datetime.timedelta(minutes=1)  # stop handing out a PAR this long before it expires
+MAX_WORKERS = 8
+
+ObjectLocation = collections.namedtuple("ObjectLocation", ["endpoint", "namespace_name", "bucket_name", "object_name"])
+
+
+def parse_object_url(url):
+    """Splits an Object Storage URL (/n/<ns>/b/<bucket>/o/<object>), or returns None."""
+    parsed_url = urlparse(url)
+    path_parts = parsed_url.path.split("/")
+    if len(path_parts) >= 7 and path_parts[1] == "n" and path_parts[3] == "b" and path_parts[5] == "o":
+        return ObjectLocation(
+            f"{parsed_url.scheme}://{parsed_url.netloc}",
+            path_parts[2],
+            path_parts[4],
+            unquote("/".join(path_parts[6:])),  # object names may contain "/" (and "o/")
+        )
+    return None
+
+
+class ParCache:
+    def __init__(self, client, lifetime=PAR_LIFETIME, max_workers=MAX_WORKERS):
+        self.client = client
+        self.lifetime = lifetime
+        self.created = 0
+        self.reused = 0
+        self._pars = {}  # ObjectLocation -> (par_url, time_expires)
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def _create(self, location):
+        time_expires = datetime.datetime.now(pytz.timezone('UTC')) + self.lifetime
+        par_details = CreatePreauthenticatedRequestDetails(
+            name=f"Download_{location.object_name}",
+            access_type="ObjectRead",
+            time_expires=time_expires,
+            object_name=location.object_name,
+        )
+        par = self.client.create_preauthenticated_request(
+            location.namespace_name,
+            location.bucket_name,
+            par_details,
+        )
+        par_url = location.endpoint + par.data.access_uri
+        with self._lock:
+            self._pars[location] = (par_url, time_expires)
+            self.created += 1
+        return par_url
+
+    def resolve(self, urls):
+        """Maps each Object Storage URL to a PAR URL, or to the exception raised creating it.
+
+        URLs that are not Object Storage object URLs are left out of the result.
+        """
+        now = datetime.datetime.now(pytz.timezone('UTC'))
+        locations = {url: parse_object_url(url) for url in set(urls)}
+        resolved, futures = {}, {}
+        with self._lock:
+            # PARs too close to expiry are never handed out again; drop them so the map stays small
+            for location in [location for location, (_, expires) in self._pars.items() if expires - now <= REUSE_MARGIN]:
+                del self._pars[location]
+            for location in set(filter(None, locations.values())):
+                cached = self._pars.get(location)
+                if cached:
+                    resolved[location] = cached[0]
+                    self.reused += 1
+        for location in set(filter(None, locations.values())) - resolved.keys():
+            futures[location] = self._executor.submit(self._create, location)
+        for location, future in futures.items():
+            try:
+                resolved[location] = future.result()
+            except Exception as e:
+                resolved[location] = e
+        return {url: resolved[location] for url, location in locations.items() if location}
+
+
+_par_cache = None
+_par_cache_lock = threading.Lock()
+
+
+def get_par_cache():
+    """Returns the process-wide PAR cache."""
+    global _par_cache
+    with _par_cache_lock:
+        if _par_cache is None:
+            _par_cache = ParCache(get_object_storage_client())
+        return _par_cache
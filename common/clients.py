@@ -0,0 +1,116 @@
+"""Process-wide registry of pooled OCI clients.
+
+Streamlit re-executes a page on every rerun, so clients built at module level
+repeat config parsing, signer setup and TLS handshakes each time. Clients here
+are built once per process, shared by all pages and sessions, and keep their
+HTTP connections alive in a larger pool.
+"""
+import threading
+
+import oci
+import genai_agent_service_bmc_python_client
+
+POOL_CONNECTIONS = 4  # distinct hosts kept per client
+POOL_MAXSIZE = 16  # keep-alive connections per host, enough for our worker pools
+TIMEOUT = (10, 240)
+
+_lock = threading.Lock()
+_config = {}
+_clients = {}
+_requests = {}
+
+
+def get_config(profile_name="DEFAULT"):
+    """Returns the parsed ~/.oci/config profile, read once per process."""
+    with _lock:
+        if profile_name not in _config:
+            _config[profile_name] = oci.config.from_file(profile_name=profile_name)
+        return _config[profile_name]
+
+
+def _pool_connections(client):
+    """Replaces the client's HTTP adapters with larger keep-alive pools."""
+    session = getattr(client.base_client, "session", None)
+    if session is None:
+        return client
+    for prefix, adapter in list(session.adapters.items()):
+        session.mount(prefix, type(adapter)(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE))
+    return client
+
+
+def _get_client(key, factory):
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _pool_connections(factory())
+        _requests[key] = _requests.get(key, 0) + 1
+        return client
+
+
+def get_object_storage_client():
+    return _get_client(
+        ("object_storage",),
+        lambda: oci.object_storage.ObjectStorageClient(get_config()),
+    )
+
+
+def get_speech_client():
+    return _get_client(
+        ("ai_speech",),
+        lambda: oci.ai_speech.AIServiceSpeechClient(get_config()),
+    )
+
+
+def get_inference_client(endpoint):
+    return _get_client(
+        ("generative_ai_inference", endpoint),
+        lambda: oci.generative_ai_inference.GenerativeAiInferenceClient(
+            config=get_config(),
+            service_endpoint=endpoint,
+            retry_strategy=oci.retry.NoneRetryStrategy(),
+            timeout=TIMEOUT,
+        ),
+    )
+
+
+def get_agent_runtime_client(endpoint):
+    return _get_client(
+        ("agent_runtime", endpoint),
+        lambda: genai_agent_service_bmc_python_client.GenerativeAiAgentRuntimeClient(
+            config=get_config(),
+            service_endpoint=endpoint,
+            retry_strategy=oci.retry.NoneRetryStrategy(),
+            timeout=TIMEOUT,
+        ),
+    )
+
+
+def pool_stats():
+    """Returns one row per client and host with connection reuse counters.
+
+    `connections` counts new connections (TLS handshakes) and `requests` the
+    HTTP requests sent over them; `lookups` counts how often pages asked the
+    registry for the client.
+    """
+    rows = []
+    with _lock:
+        clients = list(_clients.items())
+    for key, client in clients:
+        name = "/".join(key)
+        session = getattr(client.base_client, "session", None)
+        pools = []
+        if session is not None:
+            for adapter in session.adapters.values():
+                connection_pools = adapter.poolmanager.pools
+                pools.extend(connection_pools[pool_key] for pool_key in connection_pools.keys())
+        if not pools:
+            rows.append({"client": name, "host": None, "connections": 0, "requests": 0, "lookups": _requests.get(key, 0)})
+        for pool in pools:
+            rows.append({
+                "client": name,
+                "host": pool.host,
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+                "lookups": _requests.get(key, 0),
+            })
+    return rows
@@ -0,0 +1,57 @@
+"""Content fingerprints for uploaded recordings.
+
+A recording is identified by the SHA-256 of its bytes plus the Speech settings
+it was transcribed with. The index lives next to the data in Object Storage,
+one small JSON object per fingerprint (`fingerprints/<sha>.json`), pointing at
+the transcript, summary and speech output objects of the earlier run. Any app
+instance sharing the bucket can then skip a repeat transcription job.
+"""
+import hashlib
+import json
+
+import oci
+
+FINGERPRINT_PREFIX = "fingerprints/"
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def fingerprint(stream, *settings, chunk_size=HASH_CHUNK_SIZE):
+    """Hashes a binary stream chunk by chunk together with `settings`; rewinds the stream."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    digest.update(json.dumps(settings).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FingerprintIndex:
+    def __init__(self, client, namespace_name, bucket_name, prefix=FINGERPRINT_PREFIX):
+        self.client = client
+        self.namespace_name = namespace_name
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+
+    def _object_name(self, key):
+        return self.prefix + key + ".json"
+
+    def get(self, key):
+        """Returns the stored entry for a fingerprint, or None."""
+        try:
+            response = self.client.get_object(self.namespace_name, self.bucket_name, self._object_name(key))
+        except oci.exceptions.ServiceError as e:
+            if e.status != 404:
+                print(f"Error reading fingerprint {key}: {e}")
+            return None
+        try:
+            return json.loads(response.data.content)
+        except ValueError as e:
+            print(f"Error reading fingerprint {key}: {e}")
+            return None
+
+    def put(self, key, entry):
+        try:
+            self.client.put_object(self.namespace_name, self.bucket_name, self._object_name(key),
+                                   json.dumps(entry).encode("utf-8"), content_type="application/json")
+        except oci.exceptions.ServiceError as e:
+            print(f"Error writing fingerprint {key}: {e}")
@@ -0,0 +1,173 @@
+"""Background tracker for OCI Speech transcription jobs.
+
+Jobs are polled on a background thread with adaptive backoff, and their state
+is kept in a JSON registry on disk, so a page can read the status of a job
+without blocking and pick it up again after a rerun, a reconnect or an app
+restart. Jobs with several input objects also record the state of each
+transcription task, so a batch can report progress per file.
+"""
+import json
+import os
+import threading
+import time
+
+import oci
+
+TERMINAL_STATES = ("SUCCEEDED", "FAILED", "CANCELED")
+MIN_POLL_INTERVAL = 5  # seconds; a new job is unlikely to finish sooner
+MAX_POLL_INTERVAL = 30
+BACKOFF = 1.5  # interval growth while a job stays in the same state
+REGISTRY_PATH = ".cache/transcription_jobs.json"
+KEEP_FINISHED = 7 * 24 * 60 * 60  # seconds a finished job stays in the registry
+
+
+class JobTracker:
+    def __init__(self, speech_client, registry_path=REGISTRY_PATH):
+        self.speech_client = speech_client
+        self.registry_path = registry_path
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._jobs = self._load()
+        threading.Thread(target=self._poll_loop, daemon=True, name="speech-job-tracker").start()
+
+    def _load(self):
+        try:
+            with open(self.registry_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            print(f"Error reading job registry {self.registry_path}: {e}")
+            return {}
+
+    def _save(self):
+        """Writes the registry atomically; call with the lock held."""
+        os.makedirs(os.path.dirname(self.registry_path) or ".", exist_ok=True)
+        tmp_path = self.registry_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._jobs, f, indent=1)
+        os.replace(tmp_path, self.registry_path)
+
+    def track(self, job_id, **info):
+        """Registers a job; `info` (output prefix, input `objects`, ...) is kept with it."""
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = dict(
+                info,
+                state="ACCEPTED",
+                percent_complete=0,
+                error=None,
+                tasks=[],
+                created=now,
+                updated=now,
+                interval=MIN_POLL_INTERVAL,
+                next_poll=now + MIN_POLL_INTERVAL,
+            )
+            self._save()
+        self._wake.set()
+
+    def status(self, job_id):
+        """Returns a copy of the job's registry entry, or None for unknown jobs."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _poll(self, job_id):
+        try:
+            job = self.speech_client.get_transcription_job(transcription_job_id=job_id).data
+            state, percent, error = job.lifecycle_state, job.percent_complete, job.lifecycle_details
+        except oci.exceptions.ServiceError as e:
+            if e.status != 404:
+                print(f"Error polling transcription job {job_id}: {e}")
+                state, percent, error = None, None, str(e)
+            else:
+                state, percent, error = "FAILED", None, "Transcription job not found"
+        except Exception as e:  # network errors and timeouts; try again later
+            print(f"Error polling transcription job {job_id}: {e}")
+            state, percent, error = None, None, str(e)
+        with self._lock:
+            batch = len(self._jobs[job_id].get("objects", ())) > 1
+        tasks = self._poll_tasks(job_id) if batch and state is not None else None
+        now = time.time()
+        with self._lock:
+            entry = self._jobs[job_id]
+            if state is not None and state != entry["state"]:
+                entry["interval"] = MIN_POLL_INTERVAL
+                entry["state"] = state
+            else:
+                entry["interval"] = min(entry["interval"] * BACKOFF, MAX_POLL_INTERVAL)
+            if percent is not None:
+                entry["percent_complete"] = percent
+            if state in ("FAILED", "CANCELED") or state is None:
+                entry["error"] = error
+            if tasks is not None:
+                entry["tasks"] = tasks
+            entry["updated"] = now
+            entry["next_poll"] = now + entry["interval"]
+            self._save()
+
+    def _poll_tasks(self, job_id):
+        """Returns the state of every file in a batch job, or None if it could not be listed."""
+        try:
+            tasks = oci.pagination.list_call_get_all_results(
+                self.speech_client.list_transcription_tasks, transcription_job_id=job_id).data
+        except Exception as e:
+            print(f"Error listing tasks of transcription job {job_id}: {e}")
+            return None
+        return [{"name": task.display_name, "state": task.lifecycle_state,
+                 "percent_complete": task.percent_complete or 0, "error": task.lifecycle_details}
+                for task in tasks]
+
+    def _backoff(self, job_id):
+        """Delays the next poll of a job whose poll raised."""
+        with self._lock:
+            entry = self._jobs[job_id]
+            entry["interval"] = min(entry["interval"] * BACKOFF, MAX_POLL_INTERVAL)
+            entry["next_poll"] = time.time() + entry["interval"]
+
+    def _prune(self):
+        """Drops jobs that finished more than KEEP_FINISHED seconds ago."""
+        cutoff = time.time() - KEEP_FINISHED
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items()
+                        if job["state"] in TERMINAL_STATES and job["updated"] < cutoff]
+            for job_id in finished:
+                del self._jobs[job_id]
+            if finished:
+                self._save()
+
+    def _poll_loop(self):
+        while True:
+            now = time.time()
+            with self._lock:
+                active = {job_id: job["next_poll"] for job_id, job in self._jobs.items()
+                          if job["state"] not in TERMINAL_STATES}
+            for job_id, next_poll in active.items():
+                if next_poll <= now:
+                    try:
+                        self._poll(job_id)
+                    except Exception as e:  # e.g. the registry could not be written; keep the thread alive
+                        print(f"Error updating transcription job {job_id}: {e}")
+                        self._backoff(job_id)
+            try:
+                self._prune()
+            except Exception as e:
+                print(f"Error pruning job registry {self.registry_path}: {e}")
+            with self._lock:
+                next_polls = [job["next_poll"] for job in self._jobs.values() if job["state"] not in TERMINAL_STATES]
+            timeout = max(min(next_polls) - time.time(), 0.1) if next_polls else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_job_tracker(speech_client, registry_path=REGISTRY_PATH):
+    """Returns the process-wide job tracker."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = JobTracker(speech_client, registry_path)
+        return _tracker
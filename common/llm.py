@@ -0,0 +1,81 @@
+"""LangChain helpers for the LLM Playground."""
+import hashlib
+import json
+import queue
+import threading
+import time
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+
+def is_deterministic(model_kwargs):
+    """Temperature 0 answers are repeatable, so they can be cached."""
+    return model_kwargs.get("temperature") == 0
+
+
+def response_key(model_id, model_kwargs, prompt):
+    """Returns the response cache key for a fully rendered prompt."""
+    payload = json.dumps([model_id, model_kwargs, prompt], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """Passes every new token to `on_token(text_so_far)` and times the stream.
+
+    After the run, `ttft` holds the seconds to the first token and `total` the
+    seconds to the end of the response.
+    """
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.text = ""
+        self.ttft = None
+        self.total = None
+        self._start = time.perf_counter()
+
+    def on_llm_start(self, *args, **kwargs):
+        self._start = time.perf_counter()
+
+    def on_chat_model_start(self, *args, **kwargs):
+        self._start = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+        self.text += token
+        self.on_token(self.text)
+
+    def on_llm_end(self, *args, **kwargs):
+        self.total = time.perf_counter() - self._start
+
+
+def stream_compare(llms, prompt):
+    """Sends one prompt to several chat models at once and merges their streams.
+
+    `llms` maps a display name to a chat model. Each model runs on its own
+    thread and pushes its progress to a queue, which is drained here on the
+    caller's thread (Streamlit elements can only be updated from there).
+    Yields `(name, text_so_far, result)`; `result` is None while a model is
+    still streaming and a dict with `ttft`, `total`, `error` once it is done.
+    """
+    updates = queue.Queue()
+
+    def run(name, llm):
+        handler = TokenStreamHandler(lambda text: updates.put((name, text, None)))
+        error = None
+        try:
+            text = llm.invoke(prompt, config={"callbacks": [handler]}).content
+        except Exception as e:  # one failing model should not stop the others
+            text, error = handler.text, e
+        if handler.total is None:
+            handler.total = time.perf_counter() - handler._start
+        updates.put((name, text, {"ttft": handler.ttft, "total": handler.total, "error": error}))
+
+    for name, llm in llms.items():
+        threading.Thread(target=run, args=(name, llm), daemon=True, name=f"compare-{name}").start()
+    remaining = len(llms)
+    while remaining:
+        name, text, result = updates.get()
+        if result is not None:
+            remaining -= 1
+        yield name, text, result
@@ -0,0 +1,140 @@
+"""Conversation memory with a fixed token budget.
+
+`ConversationBufferWindowMemory` keeps the last k turns whatever their length.
+`TokenBudgetMemory` instead keeps as many recent turns as fit in a budget
+counted with tiktoken, and folds the turns that no longer fit into a running
+summary on a background thread, so the next request never waits for the
+summarization call. Until a turn has been folded in, it is left out of the
+prompt rather than letting the prompt grow past the budget.
+"""
+import threading
+
+from langchain_core.memory import BaseMemory
+from pydantic import PrivateAttr
+
+from common.chunking import count_tokens
+
+SUMMARY_SHARE = 0.3  # part of the budget reserved for the running summary
+
+SUMMARY_PROMPT = """Progressively summarize the conversation below, adding onto the previous summary. Keep names, numbers, code identifiers and decisions. Return only the new summary.
+
+Previous summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:"""
+
+
+def format_turn(human, ai, human_prefix="Human", ai_prefix="Assistant"):
+    return f"{human_prefix}: {human}\n{ai_prefix}: {ai}"
+
+
+class TokenBudgetMemory(BaseMemory):
+    """Recent turns plus a rolling summary, together at most `max_tokens` tokens.
+
+    `summarize` is called with a prompt and returns the model's text; it runs
+    on a background thread.
+    """
+
+    summarize: object
+    max_tokens: int = 1500
+    memory_key: str = "history"
+    input_key: str = "input"
+    human_prefix: str = "Human"
+    ai_prefix: str = "Assistant"
+
+    _turns: list = PrivateAttr(default_factory=list)  # (text, tokens), oldest first
+    _pending: list = PrivateAttr(default_factory=list)  # turns waiting to be summarized
+    _summary: str = PrivateAttr(default="")
+    _lock: object = PrivateAttr(default_factory=threading.Lock)
+    _summarizing: bool = PrivateAttr(default=False)
+    _generation: int = PrivateAttr(default=0)  # bumped by clear() to discard summaries in flight
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    def _summary_budget(self):
+        return int(self.max_tokens * SUMMARY_SHARE)
+
+    def _history(self):
+        """Renders the summary and the newest turns that fit; call with the lock held."""
+        parts = []
+        budget = self.max_tokens
+        if self._summary:
+            summary = f"Summary of the earlier conversation: {self._summary}"
+            budget -= count_tokens(summary)
+            parts.append(summary)
+        recent = []
+        for text, tokens in reversed(self._turns):
+            if tokens > budget:
+                break
+            recent.insert(0, text)
+            budget -= tokens
+        return "\n".join(parts + recent)
+
+    def load_memory_variables(self, inputs):
+        with self._lock:
+            return {self.memory_key: self._history()}
+
+    def save_context(self, inputs, outputs):
+        human = inputs.get(self.input_key) or next(iter(inputs.values()), "")
+        ai = outputs.get("response") or next(iter(outputs.values()), "")
+        text = format_turn(human, ai, self.human_prefix, self.ai_prefix)
+        with self._lock:
+            self._turns.append((text, count_tokens(text)))
+            # Leave room for the summary; older turns move to the summarizer
+            turn_budget = self.max_tokens - self._summary_budget()
+            while len(self._turns) > 1 and sum(tokens for _, tokens in self._turns) > turn_budget:
+                self._pending.append(self._turns.pop(0)[0])
+            start = bool(self._pending) and not self._summarizing
+            if start:
+                self._summarizing = True
+        if start:
+            threading.Thread(target=self._summarize_pending, daemon=True, name="memory-summarizer").start()
+
+    def _summarize_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._summarizing = False
+                    return
+                pending, self._pending = self._pending, []
+                summary, generation = self._summary, self._generation
+            try:
+                new_summary = self.summarize(SUMMARY_PROMPT.format(summary=summary or "(none)", lines="\n".join(pending))).strip()
+            except Exception as e:  # keep the chat usable if the summary call fails
+                print(f"Error summarizing conversation memory: {e}")
+                with self._lock:
+                    if generation == self._generation:
+                        # Retried with the next turn rather than lost
+                        self._pending = pending + self._pending
+                    self._summarizing = False
+                return
+            with self._lock:
+                if generation == self._generation:  # otherwise the conversation was cleared meanwhile
+                    self._summary = self._truncate(new_summary)
+
+    def _truncate(self, text):
+        """Keeps the summary inside its share of the budget."""
+        budget = self._summary_budget()
+        while text and count_tokens(text) > budget:
+            text = text[:int(len(text) * 0.9)]
+        return text
+
+    def stats(self):
+        with self._lock:
+            history = self._history()
+            return {
+                "turns kept": len(self._turns),
+                "turns waiting for summary": len(self._pending),
+                "summary tokens": count_tokens(self._summary) if self._summary else 0,
+                "history tokens": count_tokens(history) if history else 0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._turns, self._pending, self._summary = [], [], ""
+            self._generation += 1
@@ -0,0 +1,76 @@
+"""Local cache of text objects, revalidated with conditional GETs.
+
+Contents are stored in a `DiskLRUCache` under a hash of the object name,
+together with their ETag, so the cache survives restarts. Every read still
+asks Object Storage, but with `If-None-Match`, so an unchanged object comes
+back as a bodyless 304 and is served from disk; a changed object is downloaded
+once and replaces the old entry.
+"""
+import hashlib
+import json
+import threading
+
+import oci
+
+from common.summary_cache import get_disk_cache
+
+
+def object_key(object_name):
+    return hashlib.sha256(object_name.encode("utf-8")).hexdigest()
+
+
+class ObjectCache:
+    def __init__(self, client, namespace_name, bucket_name, disk):
+        self.client = client
+        self.namespace_name = namespace_name
+        self.bucket_name = bucket_name
+        self.disk = disk
+        self.not_modified = 0
+        self.downloads = 0
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+
+    def get_text(self, object_name):
+        """Returns the object's text, downloading it only if it changed since the last read."""
+        entry = self.disk.get(object_key(object_name))
+        etag, cached = json.loads(entry) if entry is not None else (None, None)
+        try:
+            response = self.client.get_object(
+                namespace_name=self.namespace_name,
+                bucket_name=self.bucket_name,
+                object_name=object_name,
+                if_none_match=etag,
+            )
+        except oci.exceptions.ServiceError as e:
+            if e.status == 304 and cached is not None:
+                with self._lock:
+                    self.not_modified += 1
+                return cached
+            raise
+        content = response.data.content
+        text = content.decode("utf-8")
+        new_etag = response.headers.get("etag")
+        if new_etag:
+            self.disk.set(object_key(object_name), json.dumps([new_etag, text]))
+        with self._lock:
+            self.downloads += 1
+            self.bytes_downloaded += len(content)
+        return text
+
+    def stats(self):
+        return {
+            "Not modified (304)": self.not_modified,
+            "Downloads": self.downloads,
+            "Downloaded (MB)": round(self.bytes_downloaded / 1024 / 1024, 2),
+            "Cached objects": len(self.disk),
+            "Cache size (MB)": round(self.disk.size() / 1024 / 1024, 2),
+        }
+
+
+def build_object_cache(secrets, object_storage_client):
+    """Builds the cache from secrets.toml settings."""
+    disk = get_disk_cache(
+        secrets.get("object_cache_dir", ".cache/objects"),
+        max_bytes=int(secrets.get("object_cache_max_mb", 128)) * 1024 * 1024,
+    )
+    return ObjectCache(object_storage_client, secrets["namespace_name"], secrets["bucket_name"], disk)
@@ -0,0 +1,83 @@
+"""Parallel, page-level PDF text extraction.
+
+Pages are extracted on a pool of worker processes (PyPDF2 is pure Python, so
+threads would serialize on the GIL). Each worker parses the document once and
+then extracts the page numbers it is given. Pages are yielded in order as soon
+as they are ready, so the chunker and the summarizer can start on the first
+pages while later ones are still being extracted. Extracted pages are cached
+by file hash and page number.
+"""
+import concurrent.futures
+import hashlib
+import io
+import multiprocessing
+import os
+
+import PyPDF2
+
+INLINE_PAGES = 16  # smaller documents are extracted on the calling thread
+BATCH_PAGES = 8  # pages per task sent to a worker
+
+_reader = None
+
+
+def _init_worker(data):
+    global _reader
+    _reader = PyPDF2.PdfReader(io.BytesIO(data))
+
+
+def _extract_pages(page_numbers):
+    return [_reader.pages[number].extract_text() or "" for number in page_numbers]
+
+
+def page_key(file_hash, page_number):
+    return hashlib.sha256(f"{file_hash}:{page_number}".encode("utf-8")).hexdigest()
+
+
+def iter_pdf_pages(data, cache=None, max_workers=None):
+    """Yields the text of every page of a PDF (given as bytes), in page order.
+
+    `cache` is any object with `get(key)`/`set(key, text)`, e.g. a
+    `DiskLRUCache`; cached pages are not extracted again.
+    """
+    file_hash = hashlib.sha256(data).hexdigest()
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    cached = {}
+    if cache is not None:
+        for number in range(page_count):
+            text = cache.get(page_key(file_hash, number))
+            if text is not None:
+                cached[number] = text
+    missing = [number for number in range(page_count) if number not in cached]
+
+    def store(number, text):
+        if cache is not None:
+            cache.set(page_key(file_hash, number), text)
+
+    if len(missing) <= INLINE_PAGES:
+        for number in range(page_count):
+            if number not in cached:
+                cached[number] = reader.pages[number].extract_text() or ""
+                store(number, cached[number])
+            yield cached.pop(number) + "\n"
+        return
+
+    # Spawned workers do not inherit the app's threads and locks
+    workers = max_workers or min(os.cpu_count() or 1, 8)
+    batches = [missing[i:i + BATCH_PAGES] for i in range(0, len(missing), BATCH_PAGES)]
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(data,))
+    try:
+        futures = {batch[0]: (batch, executor.submit(_extract_pages, batch)) for batch in batches}
+        for number in range(page_count):
+            if number not in cached:
+                batch, future = futures.pop(number)
+                for page_number, text in zip(batch, future.result()):
+                    cached[page_number] = text
+                    store(page_number, text)
+            yield cached.pop(number) + "\n"
+    finally:
+        # Also runs when the consumer stops early, e.g. on an error
+        executor.shutdown(cancel_futures=True)
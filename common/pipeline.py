@@ -0,0 +1,348 @@
+"""Headless summarization and transcription pipeline.
+
+The pages and the command line share these steps; nothing here touches
+Streamlit. Run a nightly backfill with, for example:
+
+    python -m common.pipeline summarize --prefix transcripts/ --workers 4
+    python -m common.pipeline transcribe --prefix uploads/ --batch-size 10 --summarize
+
+Settings are read from .streamlit/secrets.toml. Finished objects are recorded
+in a checkpoint file (keyed by object name and ETag), so an interrupted run
+resumes where it stopped and a changed object is processed again.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import tomllib
+
+import oci
+
+from common.bucket_index import BucketIndex
+from common.chunking import iter_chunks
+from common.clients import get_inference_client, get_object_storage_client, get_speech_client
+from common.jobs import BACKOFF, MAX_POLL_INTERVAL, MIN_POLL_INTERVAL, TERMINAL_STATES
+from common.segments import is_segment
+from common.summarize import SummaryError, map_reduce_summary
+from common.summary_cache import build_summary_cache
+from common.transcripts import format_transcript, iter_tokens
+
+INPUT_PREFIX = "uploads"
+OUTPUT_PREFIX = "speech-output"
+FINAL_PREFIX = "transcripts"
+MODEL_TYPE = "WHISPER_MEDIUM"  # or "ORACLE"
+LANGUAGE_CODE = "en"  # "en-US" for ORACLE "en" for whisper
+SUMMARY_MODEL = "command_plus_ocid"  # secrets.toml key of the summarization model
+AUDIO_EXTENSIONS = (".aac", ".ac3", ".amr", ".au", ".flac", ".m4a", ".mkv", ".mp3", ".mp4",
+                    ".oga", ".ogg", ".wav", ".webm")
+
+SUMMARY_INSTRUCTION = """Summarize this transcript with both an overview and detailed bullet points. Start with an overview in a couple of sentences. After that use bullet points to provide plenty of detail. Your response should be 1-2 pages long. 
+
+Example output: 
+## Overview
+Short overview of the entire transcript. This is 2-3 sentences long. 
+## Details
+- Detail of discussion 1
+- Detail of discussion 2 
+- Detail of discussion 3 
+... and so on
+"""
+
+
+def transcript_object_name(source_name, model_type=MODEL_TYPE):
+    return FINAL_PREFIX + "/" + source_name.split("/")[-1] + model_type + ".txt"
+
+
+def summary_object_name(source_name):
+    return FINAL_PREFIX + "/" + source_name.split("/")[-1] + "summary" + ".txt"
+
+
+def transcript_summary_name(transcript_name, model_type=MODEL_TYPE):
+    """Names a transcript's summary the way the speech page names it."""
+    return summary_object_name(transcript_name.removesuffix(model_type + ".txt"))
+
+
+def is_transcript(object_name):
+    return object_name.endswith(".txt") and not object_name.endswith("summary.txt")
+
+
+def is_recording(object_name):
+    """Audio uploads, leaving out the segments of split recordings."""
+    return object_name.lower().endswith(AUDIO_EXTENSIONS) and not is_segment(object_name)
+
+
+def load_secrets(path=".streamlit/secrets.toml"):
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+class Pipeline:
+    def __init__(self, secrets, object_storage_client=None, speech_client=None):
+        self.secrets = secrets
+        self.compartment_id = secrets["compartment_id"]
+        self.namespace_name = secrets["namespace_name"]
+        self.bucket_name = secrets["bucket_name"]
+        self.region = secrets["region"]
+        self.model_id = secrets[SUMMARY_MODEL]
+        self.object_storage_client = object_storage_client or get_object_storage_client()
+        self.speech_client = speech_client or get_speech_client()
+        self.summary_cache = build_summary_cache(secrets, self.object_storage_client)
+
+    def object_url(self, object_name):
+        return f"https://objectstorage.{self.region}.oraclecloud.com/n/{self.namespace_name}/b/{self.bucket_name}/o/{object_name}"
+
+    def read_text(self, object_name):
+        response = self.object_storage_client.get_object(self.namespace_name, self.bucket_name, object_name)
+        return response.data.content.decode("utf-8", errors="replace")
+
+    def put_text(self, object_name, text):
+        """Writes a text object and returns its URL."""
+        self.object_storage_client.put_object(
+            namespace_name=self.namespace_name,
+            bucket_name=self.bucket_name,
+            object_name=object_name,
+            put_object_body=text.encode("utf-8", errors="replace"),
+        )
+        return self.object_url(object_name)
+
+    def summarize(self, texts, instruction=SUMMARY_INSTRUCTION):
+        """Summarizes an iterable of texts with the map-reduce summarizer."""
+        client = get_inference_client(self.secrets["llm_endpoint"])
+        return map_reduce_summary(client, iter_chunks(texts), instruction, self.model_id, self.compartment_id,
+                                  cache=self.summary_cache)
+
+    def create_transcription_job(self, object_names, model_type=MODEL_TYPE, language_code=LANGUAGE_CODE):
+        """Starts one diarized transcription job for the objects; returns (job_id, output prefix)."""
+        response = self.speech_client.create_transcription_job(
+            create_transcription_job_details=oci.ai_speech.models.CreateTranscriptionJobDetails(
+                compartment_id=self.compartment_id,
+                input_location=oci.ai_speech.models.ObjectListInlineInputLocation(
+                    location_type="OBJECT_LIST_INLINE_INPUT_LOCATION",
+                    object_locations=[
+                        oci.ai_speech.models.ObjectLocation(
+                            namespace_name=self.namespace_name,
+                            bucket_name=self.bucket_name,
+                            object_names=list(object_names),
+                        )
+                    ],
+                ),
+                output_location=oci.ai_speech.models.OutputLocation(
+                    namespace_name=self.namespace_name,
+                    bucket_name=self.bucket_name,
+                    prefix=OUTPUT_PREFIX,
+                ),
+                model_details=oci.ai_speech.models.TranscriptionModelDetails(
+                    domain="GENERIC",
+                    model_type=model_type,
+                    language_code=language_code,
+                    transcription_settings=oci.ai_speech.models.TranscriptionSettings(
+                        diarization=oci.ai_speech.models.Diarization(
+                            is_diarization_enabled=True
+                        )
+                    ),
+                ),
+            )
+        )
+        return response.data.id, response.data.output_location.prefix
+
+    def wait_for_job(self, job_id):
+        """Polls a transcription job with backoff until it ends; returns the job."""
+        interval = MIN_POLL_INTERVAL
+        while True:
+            job = self.speech_client.get_transcription_job(transcription_job_id=job_id).data
+            if job.lifecycle_state in TERMINAL_STATES:
+                return job
+            time.sleep(interval)
+            interval = min(interval * BACKOFF, MAX_POLL_INTERVAL)
+
+    def speech_json_name(self, out_loc, object_name):
+        """Returns the name of the speech JSON output for one input object of a job."""
+        return out_loc + self.namespace_name + "_" + self.bucket_name + "_" + object_name + ".json"
+
+    def write_transcript(self, out_loc, object_name, model_type=MODEL_TYPE):
+        """Streams one speech output into a transcript object; returns (name, transcript)."""
+        response = self.object_storage_client.get_object(
+            self.namespace_name, self.bucket_name, self.speech_json_name(out_loc, object_name))
+        stream = response.data.raw
+        stream.decode_content = True
+        with stream:
+            transcript = format_transcript(iter_tokens(stream))
+        name = transcript_object_name(object_name, model_type)
+        if transcript:
+            self.put_text(name, transcript)
+        return name, transcript
+
+
+class Checkpoint:
+    """Completed work items, saved atomically to a JSON file after each one."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._done = json.load(f)
+        except FileNotFoundError:
+            self._done = {}
+
+    def is_done(self, key):
+        with self._lock:
+            return key in self._done
+
+    def mark(self, key, **info):
+        with self._lock:
+            self._done[key] = dict(info, finished=time.time())
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._done, f, indent=1)
+            os.replace(tmp_path, self.path)
+
+
+class Throughput:
+    """Counts finished items and input bytes and prints a running rate."""
+
+    def __init__(self, total):
+        self.total = total
+        self.items = 0
+        self.failed = 0
+        self.bytes = 0
+        self.start = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, name, size, error=None):
+        with self._lock:
+            if error:
+                self.failed += 1
+            else:
+                self.items += 1
+                self.bytes += size or 0
+            elapsed = time.time() - self.start
+            status = f"failed: {error}" if error else "done"
+            print(f"[{self.items + self.failed}/{self.total}] {name} {status} "
+                  f"({self.items / elapsed * 60:.1f} objects/min)")
+
+    def report(self):
+        elapsed = max(time.time() - self.start, 1e-9)
+        return {
+            "objects": self.items,
+            "failed": self.failed,
+            "seconds": round(elapsed, 1),
+            "objects_per_minute": round(self.items / elapsed * 60, 2),
+            "mb_per_second": round(self.bytes / 1024 / 1024 / elapsed, 3),
+        }
+
+
+def _list(pipeline, prefix):
+    index = BucketIndex(pipeline.object_storage_client, pipeline.namespace_name, pipeline.bucket_name, prefix)
+    objects = index.objects()
+    if index.error:
+        raise index.error
+    return objects
+
+
+def _pending(objects, checkpoint, select):
+    return [obj for obj in objects if select(obj.name) and not checkpoint.is_done(f"{obj.name}@{obj.etag}")]
+
+
+def summarize_prefix(pipeline, prefix, checkpoint, workers=4, instruction=SUMMARY_INSTRUCTION):
+    """Summarizes every transcript under `prefix` that has no summary and is not in the checkpoint."""
+    objects = _list(pipeline, prefix)
+    names = {obj.name for obj in objects}
+    pending = _pending(objects, checkpoint,
+                       lambda name: is_transcript(name) and transcript_summary_name(name) not in names)
+    throughput = Throughput(len(pending))
+
+    def summarize_object(obj):
+        try:
+            summary = pipeline.summarize([pipeline.read_text(obj.name)], instruction)
+            if not summary:
+                raise ValueError("empty summary")
+            output = transcript_summary_name(obj.name)
+            pipeline.put_text(output, summary)
+        except Exception as e:  # report the object and carry on with the rest
+            throughput.add(obj.name, obj.size, error=e)
+            return
+        checkpoint.mark(f"{obj.name}@{obj.etag}", output=output)
+        throughput.add(obj.name, obj.size)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(summarize_object, pending))
+    return throughput.report()
+
+
+def transcribe_prefix(pipeline, prefix, checkpoint, workers=2, batch_size=10, summarize=False,
+                      model_type=MODEL_TYPE, language_code=LANGUAGE_CODE):
+    """Transcribes every recording under `prefix` that is not in the checkpoint.
+
+    Recordings are sent `batch_size` to a job; up to `workers` jobs run at once.
+    """
+    pending = _pending(_list(pipeline, prefix), checkpoint, is_recording)
+    throughput = Throughput(len(pending))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    def transcribe_batch(batch):
+        try:
+            job_id, out_loc = pipeline.create_transcription_job([obj.name for obj in batch], model_type, language_code)
+            job = pipeline.wait_for_job(job_id)
+        except Exception as e:
+            for obj in batch:
+                throughput.add(obj.name, obj.size, error=e)
+            return
+        for obj in batch:
+            try:
+                if job.lifecycle_state != "SUCCEEDED":
+                    raise ValueError(f"job {job.lifecycle_state.lower()}: {job.lifecycle_details}")
+                output, transcript = pipeline.write_transcript(out_loc, obj.name, model_type)
+                if not transcript:
+                    raise ValueError("the transcription is empty")
+                info = {"job_id": job_id, "output": output}
+                if summarize:
+                    try:
+                        summary = pipeline.summarize([transcript])
+                    except SummaryError as e:  # the transcript is done; `summarize` can add the summary later
+                        print(f"Could not summarize {obj.name}: {e}")
+                        summary = None
+                    if summary:
+                        info["summary"] = summary_object_name(obj.name)
+                        pipeline.put_text(info["summary"], summary)
+            except Exception as e:  # report the object and carry on with the rest
+                throughput.add(obj.name, obj.size, error=e)
+                continue
+            checkpoint.mark(f"{obj.name}@{obj.etag}", **info)
+            throughput.add(obj.name, obj.size)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(transcribe_batch, batches))
+    return throughput.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize or transcribe every object under a bucket prefix.")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="settings file")
+    parser.add_argument("--checkpoint", help="progress file (default .cache/pipeline-<command>.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summarize = commands.add_parser("summarize", help="summarize transcripts")
+    summarize.add_argument("--prefix", default=FINAL_PREFIX + "/")
+    summarize.add_argument("--workers", type=int, default=4, help="transcripts summarized at once")
+    transcribe = commands.add_parser("transcribe", help="transcribe recordings")
+    transcribe.add_argument("--prefix", default=INPUT_PREFIX + "/")
+    transcribe.add_argument("--workers", type=int, default=2, help="transcription jobs running at once")
+    transcribe.add_argument("--batch-size", type=int, default=10, help="recordings per transcription job")
+    transcribe.add_argument("--summarize", action="store_true", help="also summarize each transcript")
+    args = parser.parse_args(argv)
+
+    pipeline = Pipeline(load_secrets(args.secrets))
+    checkpoint = Checkpoint(args.checkpoint or f".cache/pipeline-{args.command}.json")
+    if args.command == "summarize":
+        report = summarize_prefix(pipeline, args.prefix, checkpoint, workers=args.workers)
+    else:
+        report = transcribe_prefix(pipeline, args.prefix, checkpoint, workers=args.workers,
+                                   batch_size=args.batch_size, summarize=args.summarize)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
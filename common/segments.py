@@ -0,0 +1,168 @@
+"""Segmented transcription of long recordings.
+
+A long recording is cut into overlapping time segments with ffmpeg, each
+segment is transcribed by its own Speech job, and the token timelines are
+stitched back together: timestamps are shifted by the segment offset, the
+duplicated overlap is dropped at its midpoint, and per-segment speaker indexes
+are mapped onto one set of speakers by matching the words both segments heard
+in the overlap. Speakers who are silent in the overlap are carried over to the
+known speakers not matched yet, so a new index is only used for more speakers
+than were heard before.
+"""
+import collections
+import concurrent.futures
+import json
+import os
+import re
+import shutil
+import subprocess
+
+SEGMENT_SECONDS = 600
+OVERLAP_SECONDS = 10
+MATCH_TOLERANCE = 0.5  # seconds between the same word heard in two segments
+SEGMENT_NAME = re.compile(r"\.part\d{3}\.flac$")  # the names split_audio gives its segments
+
+
+def is_segment(object_name):
+    """True for the segment files of a split recording, which are not recordings of their own."""
+    return bool(SEGMENT_NAME.search(object_name))
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def probe_duration(path):
+    """Returns the duration of a media file in seconds."""
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return float(json.loads(output)["format"]["duration"])
+
+
+def split_audio(path, out_dir, segment_seconds=SEGMENT_SECONDS, overlap_seconds=OVERLAP_SECONDS, max_workers=2):
+    """Cuts the audio track into overlapping mono FLAC segments.
+
+    Returns a list of `(offset_seconds, segment_path)` in time order.
+    """
+    duration = probe_duration(path)
+    offsets = []
+    offset = 0.0
+    while offset < duration:
+        offsets.append(offset)
+        offset += segment_seconds
+    base = os.path.splitext(os.path.basename(path))[0]
+
+    def cut(index, start):
+        segment_path = os.path.join(out_dir, f"{base}.part{index:03d}.flac")
+        subprocess.run(
+            ["ffmpeg", "-v", "error", "-y", "-ss", str(start), "-t", str(segment_seconds + overlap_seconds),
+             "-i", path, "-vn", "-ac", "1", "-ar", "16000", "-c:a", "flac", segment_path],
+            check=True,
+        )
+        return start, segment_path
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(cut, range(len(offsets)), offsets))
+
+
+def _seconds(value):
+    return float(str(value).rstrip("s"))
+
+
+def _format_seconds(value):
+    return f"{value:.3f}s"
+
+
+def _recent_speakers(tokens):
+    """Returns the global speaker indexes in `tokens`, most recently heard first."""
+    speakers = []
+    for token in reversed(tokens):
+        if token.get("speakerIndex") not in speakers:
+            speakers.append(token.get("speakerIndex"))
+    return speakers
+
+
+def _map_speakers(previous_tokens, tokens, speaker_map, next_speaker, known=()):
+    """Adds segment-local to global speaker indexes to `speaker_map`.
+
+    Words both segments transcribed in the overlap vote for a mapping. Local
+    speakers without votes take the `known` global speakers (most recently
+    heard first) that no other local speaker has, and only get new global
+    indexes once those run out. Returns the next free index.
+    """
+    votes = collections.Counter()
+    by_word = collections.defaultdict(list)
+    for token in previous_tokens:
+        by_word[token["token"].strip().lower()].append(token)
+    for token in tokens:
+        for other in by_word.get(token["token"].strip().lower(), ()):
+            if abs(_seconds(other["startTime"]) - _seconds(token["startTime"])) <= MATCH_TOLERANCE:
+                votes[(token.get("speakerIndex"), other.get("speakerIndex"))] += 1
+                break
+    used = set(speaker_map.values())
+    for (local, global_index), _ in votes.most_common():
+        if local not in speaker_map and global_index not in used:
+            speaker_map[local] = global_index
+            used.add(global_index)
+    free = [speaker for speaker in known if speaker not in used]
+    for token in tokens:
+        local = token.get("speakerIndex")
+        if local not in speaker_map:
+            if free:
+                speaker_map[local] = free.pop(0)
+            else:
+                speaker_map[local] = next_speaker
+                next_speaker += 1
+            used.add(speaker_map[local])
+    return next_speaker
+
+
+def stitch_segments(segments, overlap_seconds=OVERLAP_SECONDS):
+    """Merges `(offset_seconds, speech_json)` pairs into one speech JSON.
+
+    The result has the same shape as a single job's output, so it can be
+    formatted like any other transcript.
+    """
+    segments = sorted(segments, key=lambda segment: segment[0])
+    merged = []
+    next_speaker = 0
+    previous_overlap = []
+    for index, (offset, data) in enumerate(segments):
+        transcriptions = data.get("transcriptions") or [{}]
+        tokens = []
+        for token in transcriptions[0].get("tokens", []):
+            token = dict(token)
+            token["startTime"] = _format_seconds(_seconds(token["startTime"]) + offset)
+            token["endTime"] = _format_seconds(_seconds(token["endTime"]) + offset)
+            tokens.append(token)
+        if index == 0:
+            speaker_map = {}
+            for token in tokens:
+                if token.get("speakerIndex") not in speaker_map:
+                    speaker_map[token.get("speakerIndex")] = next_speaker
+                    next_speaker += 1
+        else:
+            speaker_map = {}
+            overlap_end = offset + overlap_seconds
+            in_overlap = [t for t in tokens if _seconds(t["startTime"]) < overlap_end]
+            known = _recent_speakers(merged)
+            next_speaker = _map_speakers(previous_overlap, in_overlap, speaker_map, next_speaker, known)
+            # Keep the earlier segment up to the middle of the overlap, this one after it
+            cut = offset + overlap_seconds / 2
+            merged = [t for t in merged if _seconds(t["startTime"]) < cut]
+            tokens = [t for t in tokens if _seconds(t["startTime"]) >= cut]
+            next_speaker = _map_speakers([], tokens, speaker_map, next_speaker, known)
+        for token in tokens:
+            token["speakerIndex"] = speaker_map.get(token.get("speakerIndex"), token.get("speakerIndex"))
+        merged.extend(tokens)
+        if index + 1 < len(segments):
+            next_offset = segments[index + 1][0]
+            previous_overlap = [t for t in merged if _seconds(t["startTime"]) >= next_offset]
+    return {
+        "transcriptions": [{
+            "transcription": " ".join(t["token"] for t in merged),
+            "tokens": merged,
+        }]
+    }
@@ -0,0 +1,172 @@
+"""Map-reduce summarization with OCI Generative AI.
+
+Every chunk is summarized concurrently on a bounded thread pool (map), then the
+chunk summaries are merged in a tree (reduce) until they fit into one request.
+Throttled and failed requests are retried with backoff; a request that still
+fails raises `SummaryError` instead of a partial summary.
+"""
+import concurrent.futures
+import random
+import time
+
+import oci
+
+from common.chunking import count_tokens
+from common.summary_cache import cache_key
+
+MAX_WORKERS = 4  # concurrent chat calls against the inference endpoint
+REDUCE_TOKEN_LIMIT = 8000  # largest combined input we send in one reduce request
+MAX_ATTEMPTS = 4  # tries per chat request on throttling, server and network errors
+RETRY_DELAY = 2  # seconds before the first retry, doubled after each one
+
+CHAT_PARAMS = {
+    "temperature": 0,
+    "frequency_penalty": 0,
+    "top_p": 0.75,
+    "top_k": 0,
+    "max_tokens": 2000,
+}
+
+REDUCE_INSTRUCTION = """Combine the following partial summaries of consecutive sections of one text into a single summary. Keep the important details and use the same format: 
+## Overview
+Short overview of the text covered. This is 2-3 sentences long. 
+## Details
+- Detail of discussion 1
+- Detail of discussion 2 
+... and so on
+
+"""
+
+FINAL_INSTRUCTION = """Please provide a concise summary of the following text: 
+    Example output: 
+            ## Overview
+            Short overview of the entire text. This is 2-3 sentences long. 
+            ## Details
+            - Detail of discussion 1
+            - Detail of discussion 2 
+            - Detail of discussion 3 
+            ... and so on
+            """
+
+
+class SummaryError(Exception):
+    """A chat request of the summary failed, so there is no complete summary."""
+
+
+def _retryable(e):
+    if isinstance(e, oci.exceptions.ServiceError):
+        return e.status == 429 or e.status >= 500
+    return isinstance(e, (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout))
+
+
+def chat(client, message, model_id, compartment_id, params=CHAT_PARAMS):
+    """Sends one Cohere chat request and returns the response text.
+
+    The shared inference client does not retry (streaming chats must not be
+    sent twice), so throttling, server and network errors are retried here.
+    """
+    chat_request = oci.generative_ai_inference.models.CohereChatRequest()
+    chat_request.message = message
+    chat_request.temperature = params["temperature"]
+    chat_request.frequency_penalty = params["frequency_penalty"]
+    chat_request.top_p = params["top_p"]
+    chat_request.top_k = params["top_k"]
+    chat_request.max_tokens = params["max_tokens"]
+    chat_detail = oci.generative_ai_inference.models.ChatDetails()
+    chat_detail.serving_mode = oci.generative_ai_inference.models.OnDemandServingMode(model_id=model_id)
+    chat_detail.chat_request = chat_request
+    chat_detail.compartment_id = compartment_id
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            chat_response = client.chat(chat_detail)
+            break
+        except Exception as e:
+            reason = f"{e.status} {e.message}" if isinstance(e, oci.exceptions.ServiceError) else str(e)
+            if attempt + 1 == MAX_ATTEMPTS or not _retryable(e):
+                raise SummaryError(f"Chat request failed: {reason}") from e
+            delay = RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)  # jitter spreads concurrent retries
+            print(f"Chat request failed ({reason}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+    try:
+        return chat_response.data.chat_response.text
+    except (AttributeError, KeyError) as e:
+        print(f"Error processing response: {e}")
+        raise SummaryError(f"Unexpected chat response: {e}") from e
+
+
+def remove_duplicate_details(text):
+    """Removes repeated "## Details" headings, keeping the first one."""
+    first_details_index = text.find("## Details")
+    if first_details_index == -1:
+        return text
+    head = text[:first_details_index + len("## Details")]
+    remaining_text = text[first_details_index + len("## Details"):]
+    return head + remaining_text.replace("## Details", "")
+
+
+def batch_summaries(summaries, token_limit=REDUCE_TOKEN_LIMIT):
+    """Groups consecutive summaries into batches that fit in one reduce request.
+
+    Every batch holds at least two summaries (when there are two left), so each
+    reduce round at least halves the number of summaries.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for summary in summaries:
+        tokens = count_tokens(summary)
+        if len(batch) >= 2 and batch_tokens + tokens > token_limit:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(summary)
+        batch_tokens += tokens
+    if len(batch) == 1 and batches:
+        batches[-1].append(batch[0])
+    elif batch:
+        batches.append(batch)
+    return batches
+
+
+def map_reduce_summary(client, chunks, instruction, model_id, compartment_id,
+                       max_workers=MAX_WORKERS, token_limit=REDUCE_TOKEN_LIMIT, cache=None):
+    """Summarizes chunks concurrently, then reduces the summaries hierarchically.
+
+    `chunks` may be any iterable (including a lazy generator); each chunk is
+    submitted as soon as it is produced. With a `SummaryCache`, every chat
+    request (chunk, reduce and final) is looked up by content hash first, so a
+    repeat run makes no model calls. After an edit, only the chunks around it
+    (cut points are anchored to content, see common/chunking.py) and the
+    reduce steps above them are sent again. Raises `SummaryError` if any
+    request fails.
+    """
+    def summarize(prompt, text):
+        key = cache_key(text, prompt, model_id, CHAT_PARAMS)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        summary = chat(client, prompt + text, model_id, compartment_id)
+        if cache is not None:
+            cache.set(key, summary)
+        return summary
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(summarize, instruction, chunk) for chunk in chunks]
+        try:
+            summaries = [future.result() for future in futures]
+        except SummaryError:
+            for future in futures:
+                future.cancel()  # the summary is lost anyway; skip the chunks not sent yet
+            raise
+        if not summaries:
+            return ""
+        if len(summaries) == 1:
+            return summaries[0]
+
+        # Tree reduce until the combined summaries fit into one request
+        while len(summaries) > 2 and count_tokens(" ".join(summaries)) > token_limit:
+            batches = batch_summaries(summaries, token_limit)
+            summaries = list(executor.map(
+                lambda batch: summarize(REDUCE_INSTRUCTION, "\n\n".join(batch)), batches))
+
+        final_summary = remove_duplicate_details(" ".join(summaries))
+        return summarize(FINAL_INSTRUCTION, final_summary)
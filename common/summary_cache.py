@@ -0,0 +1,189 @@
+"""Content-addressed cache for chunk and final summaries.
+
+Entries are keyed by a hash of the text, the instruction, the model OCID and
+the sampling parameters, so an unchanged chunk is never summarized twice. The
+local disk tier evicts least recently used entries once it grows past its size
+limit; an optional Object Storage tier shares entries between machines.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import oci
+
+
+def cache_key(text, instruction, model_id, params):
+    """Returns the content hash used as cache key for one chat request."""
+    payload = json.dumps([text, instruction, model_id, params], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskLRUCache:
+    """Text values stored as files, evicted by last access time."""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {
+            entry.name: entry.stat().st_size
+            for entry in os.scandir(directory) if entry.is_file() and not entry.name.endswith(".tmp")
+        }
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(self._path(key))  # mark as recently used
+        except FileNotFoundError:
+            pass  # evicted by another thread since the read; the value is still good
+        return value
+
+    def set(self, key, value):
+        data = value.encode("utf-8")
+        tmp_path = self._path(key) + f".{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self._sizes[key] = len(data)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._sizes):
+                self._remove(key)
+
+    def size(self):
+        return sum(self._sizes.values())
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def _remove(self, key):
+        self._sizes.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        if self.size() <= self.max_bytes:
+            return
+        def last_used(key):
+            try:
+                return os.path.getmtime(self._path(key))
+            except FileNotFoundError:
+                return 0
+        for key in sorted(self._sizes, key=last_used):
+            if self.size() <= self.max_bytes:
+                break
+            self._remove(key)
+
+
+class ObjectStorageCache:
+    """Text values stored as objects under their own prefix."""
+
+    def __init__(self, client, namespace_name, bucket_name, prefix="summary-cache/"):
+        self.client = client
+        self.namespace_name = namespace_name
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(
+                namespace_name=self.namespace_name,
+                bucket_name=self.bucket_name,
+                object_name=self.prefix + key,
+            )
+        except oci.exceptions.ServiceError as e:
+            if e.status != 404:
+                print(f"Error reading summary cache object {key}: {e}")
+            return None
+        return response.data.content.decode("utf-8")
+
+    def set(self, key, value):
+        try:
+            self.client.put_object(
+                namespace_name=self.namespace_name,
+                bucket_name=self.bucket_name,
+                object_name=self.prefix + key,
+                put_object_body=value.encode("utf-8"),
+            )
+        except oci.exceptions.ServiceError as e:
+            print(f"Error writing summary cache object {key}: {e}")
+
+
+class SummaryCache:
+    """Looks up the disk tier first, then Object Storage, promoting remote hits."""
+
+    def __init__(self, disk, remote=None):
+        self.disk = disk
+        self.remote = remote
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.disk.get(key)
+        if value is None and self.remote is not None:
+            value = self.remote.get(key)
+            if value is not None:
+                self.disk.set(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.disk.set(key, value)
+        if self.remote is not None:
+            self.remote.set(key, value)
+
+
+_disks = {}
+_disks_lock = threading.Lock()
+
+
+def get_disk_cache(directory, max_bytes=256 * 1024 * 1024):
+    """Returns the process-wide cache of one directory.
+
+    Separate instances on the same directory would each track only their own
+    writes and together grow past `max_bytes`.
+    """
+    key = os.path.realpath(directory)
+    with _disks_lock:
+        if key not in _disks:
+            _disks[key] = DiskLRUCache(directory, max_bytes)
+        return _disks[key]
+
+
+def build_summary_cache(secrets, object_storage_client):
+    """Builds the cache from secrets.toml settings.
+
+    The Object Storage tier is only enabled when `summary_cache_prefix` is set.
+    """
+    disk = get_disk_cache(
+        secrets.get("summary_cache_dir", ".cache/summaries"),
+        max_bytes=int(secrets.get("summary_cache_max_mb", 256)) * 1024 * 1024,
+    )
+    remote = None
+    if secrets.get("summary_cache_prefix"):
+        remote = ObjectStorageCache(
+            object_storage_client,
+            secrets["namespace_name"],
+            secrets["bucket_name"],
+            prefix=secrets["summary_cache_prefix"],
+        )
+    return SummaryCache(disk, remote)
@@ -0,0 +1,51 @@
+"""Streaming conversion of OCI Speech JSON output into a readable transcript.
+
+The speech output is parsed incrementally with ijson, so only one token is in
+memory at a time, and the transcript is written in a single pass that starts
+a new paragraph whenever the diarized speaker changes. See
+benchmarks/transcripts.py for a comparison with the original conversion.
+"""
+import io
+
+import ijson
+
+TOKENS_PATH = "transcriptions.item.tokens.item"
+NO_SPACE_BEFORE = frozenset(".,!?;:%)]}'")
+
+
+def iter_tokens(stream):
+    """Yields the tokens of a speech JSON document read from a binary stream."""
+    return ijson.items(stream, TOKENS_PATH)
+
+
+def write_transcript(tokens, out, speaker_labels=True):
+    """Writes tokens to `out` grouped into speaker turns; returns the number of turns.
+
+    Tokens without a `speakerIndex` (diarization off) are written as one
+    paragraph, the same as before diarization was used.
+    """
+    speaker = None
+    turns = 0
+    need_space = False
+    for token in tokens:
+        text = token.get("token")
+        if not text:
+            continue
+        index = token.get("speakerIndex")
+        if speaker_labels and index is not None and index != speaker:
+            out.write("\n\n" if turns else "")
+            out.write(f"Speaker {int(index) + 1}: ")
+            speaker = index
+            turns += 1
+        elif need_space and text[0] not in NO_SPACE_BEFORE:
+            out.write(" ")
+        out.write(text)
+        need_space = True
+    return turns
+
+
+def format_transcript(tokens, speaker_labels=True):
+    """Returns the transcript text for an iterable of tokens."""
+    out = io.StringIO()
+    write_transcript(tokens, out, speaker_labels)
+    return out.getvalue()
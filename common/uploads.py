@@ -0,0 +1,117 @@
+"""Streaming multipart uploads to Object Storage.
+
+Large files are read part by part and uploaded on a small thread pool, so at
+most a few parts are in memory at once. Failed parts are retried with backoff
+and the multipart upload is aborted if a part keeps failing.
+"""
+import concurrent.futures
+import threading
+import time
+
+import oci
+
+PART_SIZE = 16 * 1024 * 1024
+MULTIPART_THRESHOLD = 32 * 1024 * 1024  # smaller files go up in a single put_object
+PARALLEL_PARTS = 3
+MAX_ATTEMPTS = 4
+
+
+def _with_retries(operation, description):
+    delay = 1
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return operation()
+        except oci.exceptions.ServiceError as e:
+            if attempt == MAX_ATTEMPTS or not (e.status == 429 or e.status >= 500):
+                raise
+            error = e
+        except (oci.exceptions.RequestException, oci.exceptions.ConnectTimeout) as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            error = e
+        print(f"Retrying {description} (attempt {attempt} failed: {error})")
+        time.sleep(delay)
+        delay *= 2
+
+
+def upload_stream(client, namespace_name, bucket_name, object_name, stream, size=None,
+                  part_size=PART_SIZE, parallel_parts=PARALLEL_PARTS, metadata=None):
+    """Uploads a file-like object and returns upload statistics.
+
+    The returned dict holds `bytes`, `seconds`, `parts` and `mb_per_second`.
+    """
+    start = time.perf_counter()
+    if size is not None and size <= MULTIPART_THRESHOLD:
+        data = stream.read()
+        kwargs = {"opc_meta": metadata} if metadata else {}
+        _with_retries(lambda: client.put_object(
+            namespace_name=namespace_name,
+            bucket_name=bucket_name,
+            object_name=object_name,
+            put_object_body=data,
+            **kwargs,
+        ), f"upload of {object_name}")
+        total, parts = len(data), 1
+    else:
+        total, parts = _multipart_upload(client, namespace_name, bucket_name, object_name, stream,
+                                         part_size, parallel_parts, metadata)
+    seconds = time.perf_counter() - start
+    return {
+        "bytes": total,
+        "seconds": round(seconds, 2),
+        "parts": parts,
+        "mb_per_second": round(total / 1024 / 1024 / seconds, 2) if seconds else None,
+    }
+
+
+def _multipart_upload(client, namespace_name, bucket_name, object_name, stream, part_size, parallel_parts, metadata):
+    upload_id = client.create_multipart_upload(
+        namespace_name,
+        bucket_name,
+        oci.object_storage.models.CreateMultipartUploadDetails(object=object_name, metadata=metadata),
+    ).data.upload_id
+    # A part is only read once a worker slot is free, so at most parallel_parts parts are in memory
+    in_flight = threading.BoundedSemaphore(parallel_parts)
+
+    def upload_part(part_num, data):
+        try:
+            response = _with_retries(lambda: client.upload_part(
+                namespace_name, bucket_name, object_name, upload_id, part_num, data,
+            ), f"part {part_num} of {object_name}")
+            return part_num, response.headers["etag"]
+        finally:
+            in_flight.release()
+
+    total = 0
+    futures = []
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parallel_parts) as executor:
+            part_num = 1
+            while True:
+                in_flight.acquire()
+                data = stream.read(part_size)
+                if not data:
+                    in_flight.release()
+                    break
+                total += len(data)
+                futures.append(executor.submit(upload_part, part_num, data))
+                part_num += 1
+                if any(f.done() and f.exception() for f in futures):
+                    break  # stop reading; the failure is raised below
+            etags = [future.result() for future in futures]
+        client.commit_multipart_upload(
+            namespace_name,
+            bucket_name,
+            object_name,
+            upload_id,
+            oci.object_storage.models.CommitMultipartUploadDetails(
+                parts_to_commit=[
+                    oci.object_storage.models.CommitMultipartUploadPartDetails(part_num=num, etag=etag)
+                    for num, etag in etags
+                ]
+            ),
+        )
+    except Exception:
+        client.abort_multipart_upload(namespace_name, bucket_name, object_name, upload_id)
+        raise
+    return total, len(futures)
@@ -1,24 +1,17 @@
 # Streamlit and UI imports
 import streamlit as st
-import datetime
-import pytz
-from datetime import timedelta
-import yaml
-from urllib.parse import urlparse, unquote 
-
-# OCI-related imports
-import oci
-from oci.config import from_file
-from oci.object_storage import ObjectStorageClient
-from oci.object_storage.models import CreatePreauthenticatedRequestDetails
 
 # LangChain-related imports (grouped together and organized alphabetically)
 from langchain.chains import ConversationChain
 from langchain.memory import ConversationBufferWindowMemory
-from langchain.memory.chat_message_histories import StreamlitChatMessageHistory
 from langchain_community.chat_models.oci_generative_ai import ChatOCIGenAI
 from langchain.prompts.prompt import PromptTemplate
-from langchain.schema import HumanMessage  # Added this for clarity 
+
+from common.chunking import count_tokens
+from common.clients import get_inference_client
+from common.llm import TokenStreamHandler, is_deterministic, response_key, stream_compare
+from common.memory import TokenBudgetMemory
+from common.summary_cache import get_disk_cache
 
 
 AVATAR_MAPPING = {
@@ -26,6 +19,9 @@ AVATAR_MAPPING = {
 "assistant": st.secrets["llm_avatar"]
 }
 
+# Messages a fragment redraws before a full run takes them into the transcript
+LIVE_MESSAGES = 6
+
 st.set_page_config(page_title="LLM Playground", layout="centered", 
                    initial_sidebar_state="expanded", menu_items=None)
 
@@ -34,7 +30,6 @@ st.logo(logo_image_path, size="large")
 
 # OCI Configuration
 CONFIG_PROFILE = "DEFAULT" #DEFAULT or PUBSEC06
-config = oci.config.from_file()
 endpoint = st.secrets["endpoint"]
 compartment_id = st.secrets["compartment_id"]
 llm_endpoint = st.secrets["llm_endpoint"]
@@ -63,9 +58,17 @@ CLAUDE_PROMPT = PromptTemplate(
 
 INIT_MESSAGE = {"role": "assistant", "content": "Hi! I am Oracle Generative AI! How may I help you?"}
 
+@st.cache_resource
+def get_response_cache():
+    """Temperature 0 answers shared by all sessions, keyed by model, parameters and rendered prompt."""
+    return get_disk_cache(st.secrets.get("response_cache_dir", ".cache/responses"),
+                          max_bytes=int(st.secrets.get("response_cache_max_mb", 64)) * 1024 * 1024)
+
 # Re-initialize the chat after
 def new_chat():
-    st.session_state["messages"] = [INIT_MESSAGE]
+    st.session_state["messages"] = [dict(INIT_MESSAGE)]
+    if "chat_memory" in st.session_state:
+        st.session_state.chat_memory.clear()
     st.toast("Chat reset!")
     
 
@@ -74,19 +77,39 @@ def update_params():
     st.toast("Parameters saved!")
     
 
+options = ["cohere.command-r-08-2024", 
+           "cohere.command-r-plus-08-2024",
+           "meta.llama-3.3-70b-instruct"]
+
+# Sidebar values used while their control is hidden
+DEFAULTS = {"llm_model": options[0], "compare": False, "compare_models": options,
+            "temperature": 0.3, "top_p": 0.75, "top_k": 0, "max_tokens": 500,
+            "frequency_penalty": 0.0, "presence_penalty": 0.0,
+            "memory_mode": "Window", "memory_window": 3, "memory_tokens": 2000}
+
+def setting(key):
+    """Current value of a sidebar control, or its default when the control is not shown."""
+    return st.session_state.get(key, DEFAULTS[key])
+
+
 # Sidebar info
-with st.sidebar:
+@st.fragment
+def sidebar_controls():
+    """Sidebar controls; using them reruns only this fragment, not the chat."""
     col1, col2 = st.columns(2)
     with col1:
         st.button("Save Changes", on_click=update_params, type='primary', use_container_width=True) 
     with col2:
-        st.button("Reset Chat", on_click=new_chat, type='primary', use_container_width=True)
-    options = ["cohere.command-r-08-2024", 
-               "cohere.command-r-plus-08-2024",
-               "meta.llama-3.3-70b-instruct"]
+        if st.button("Reset Chat", type='primary', use_container_width=True):
+            new_chat()
+            st.rerun()  # the transcript is outside this fragment
     st.markdown("## LLM Model Selection")
-    LLM_MODEL = st.selectbox("Choose your desired LLM model:", options, index=0, 
-                            help="Defaults to cohere command r")
+    st.selectbox("Choose your desired LLM model:", options, index=0, key="llm_model",
+                 help="Defaults to cohere command r")
+    st.toggle("Compare Models", value=DEFAULTS["compare"], key="compare",
+              help="Send each prompt to several models at once and show the answers side by side. Compared answers are not added to the conversation memory.")
+    if setting("compare"):
+        st.multiselect("Models to compare:", options, default=DEFAULTS["compare_models"], key="compare_models")
     
     if "dropdown_visible" not in st.session_state:
         st.session_state.dropdown_visible = False  # Start with the dropdown visible
@@ -96,48 +119,109 @@ with st.sidebar:
     on = st.toggle("Show Parameter Tuning", value=True)
     if on:
         st.markdown("## Inference Parameters")
-        TEMPERATURE = st.slider("Temperature", min_value=0.0,
-                                max_value=1.0, value=0.3, step=0.1,
-                                help="A number that sets the randomness of the generated output. A lower temperature means less random generations. Use lower numbers for tasks such as question answering or summarizing. High temperatures can generate hallucinations or factually incorrect information.")
-        TOP_P = st.slider("Top-P", min_value=0.0,
-                        max_value=1.0, value=0.75, step=0.01,
-                        help="To eliminate tokens with low likelihood, assign p a minimum percentage for the next token's likelihood. For example, when p is set to 0.75, the model eliminates the bottom 25 percent for the next token. Set to 1.0 to consider all tokens and set to 0 to disable. If both k and p are enabled, p acts after k.")
-        TOP_K = st.slider("Top-K", min_value=1,
-                        max_value=500, value=0, step=5,
-                        help="A sampling method in which the model chooses the next token randomly from the top k most likely tokens. A higher value for k generates more random output, which makes the output text sound more natural.")
-        MAX_TOKENS = st.slider("Max Tokens", min_value=0,
-                            max_value=4000, value=500, step=8,
-                            help="The maximum number of output tokens that the model will generate for the response. A token is generally a few letters.")
-        FREQUENCY_PENALTY = st.slider("Frequency Penalty", min_value=0.0,
-                                max_value=1.0, value=0.0, step=0.1,
-                                help="To reduce repetitiveness of generated tokens, this number penalizes new tokens based on their frequency in the generated text so far. Greater numbers encourage the model to use new tokens, while lower numbers encourage the model to repeat the tokens.")
-        PRESENCE_PENALTY = st.slider("Presence Penalty", min_value=0.0,
-                                max_value=1.0, value=0.0, step=0.1,
-                                help="To reduce repetitiveness of generated tokens, this number penalizes new tokens based on whether they've appeared in the generated text so far. Greater numbers encourage the model to use new tokens, while lower numbers encourage the model to repeat the tokens.")
-        MEMORY_WINDOW = st.slider("Memory Window", min_value=0,
-                                max_value=10, value=3, step=1,
-                                help="How many interactions to keep in memory.")
+        st.slider("Temperature", min_value=0.0,
+                  max_value=1.0, value=DEFAULTS["temperature"], step=0.1, key="temperature",
+                  help="A number that sets the randomness of the generated output. A lower temperature means less random generations. Use lower numbers for tasks such as question answering or summarizing. High temperatures can generate hallucinations or factually incorrect information.")
+        st.slider("Top-P", min_value=0.0,
+                  max_value=1.0, value=DEFAULTS["top_p"], step=0.01, key="top_p",
+                  help="To eliminate tokens with low likelihood, assign p a minimum percentage for the next token's likelihood. For example, when p is set to 0.75, the model eliminates the bottom 25 percent for the next token. Set to 1.0 to consider all tokens and set to 0 to disable. If both k and p are enabled, p acts after k.")
+        st.slider("Top-K", min_value=1,
+                  max_value=500, value=DEFAULTS["top_k"], step=5, key="top_k",
+                  help="A sampling method in which the model chooses the next token randomly from the top k most likely tokens. A higher value for k generates more random output, which makes the output text sound more natural.")
+        st.slider("Max Tokens", min_value=0,
+                  max_value=4000, value=DEFAULTS["max_tokens"], step=8, key="max_tokens",
+                  help="The maximum number of output tokens that the model will generate for the response. A token is generally a few letters.")
+        st.slider("Frequency Penalty", min_value=0.0,
+                  max_value=1.0, value=DEFAULTS["frequency_penalty"], step=0.1, key="frequency_penalty",
+                  help="To reduce repetitiveness of generated tokens, this number penalizes new tokens based on their frequency in the generated text so far. Greater numbers encourage the model to use new tokens, while lower numbers encourage the model to repeat the tokens.")
+        st.slider("Presence Penalty", min_value=0.0,
+                  max_value=1.0, value=DEFAULTS["presence_penalty"], step=0.1, key="presence_penalty",
+                  help="To reduce repetitiveness of generated tokens, this number penalizes new tokens based on whether they've appeared in the generated text so far. Greater numbers encourage the model to use new tokens, while lower numbers encourage the model to repeat the tokens.")
+        st.radio("Memory Mode", ["Window", "Token budget"], index=0, horizontal=True, key="memory_mode",
+                 help="Window keeps the last few interactions whatever their length. Token budget keeps the prompt history under a fixed number of tokens and summarizes older interactions in the background.")
+        if setting("memory_mode") == "Window":
+            st.slider("Memory Window", min_value=0,
+                      max_value=10, value=DEFAULTS["memory_window"], step=1, key="memory_window",
+                      help="How many interactions to keep in memory.")
+        else:
+            st.slider("Memory Token Budget", min_value=256,
+                      max_value=8000, value=DEFAULTS["memory_tokens"], step=256, key="memory_tokens",
+                      help="The most tokens of conversation history sent with each request, including the summary of older interactions.")
+
+    response_cache = get_response_cache()
+    with st.expander("Response Cache"):
+        st.write(f"Cached answers: {len(response_cache)}")
+        st.write(f"Cache size (MB): {response_cache.size() / 1024 / 1024:.2f}")
+        st.caption("Only answers generated with temperature 0 are cached.")
+        if st.button("Clear Cache", use_container_width=True):
+            response_cache.clear()
+            st.toast("Response cache cleared!")
+
+def render_chat_stats():
+    """Stats that change with every message; drawn by the chat fragment into the sidebar."""
+    memory = st.session_state["conv_chain"].memory if "conv_chain" in st.session_state else None
+    if isinstance(memory, TokenBudgetMemory):
+        with st.expander("Conversation Memory"):
+            for key, value in memory.stats().items():
+                st.write(f"{key}: {value}")
+
+    if st.session_state.get("ttft"):
+        with st.expander("Time to First Token"):
+            st.dataframe(
+                [{"model": model, "responses": len(values), "last (s)": round(values[-1], 2),
+                  "average (s)": round(sum(values) / len(values), 2)}
+                 for model, values in st.session_state.ttft.items()],
+                hide_index=True)
 
-# Initialize the ConversationChain
-def init_conversationchain():
-    model_kwargs = {'temperature': TEMPERATURE,
-                    'top_p': TOP_P,
-                    'top_k': TOP_K,
-                    'max_tokens': MAX_TOKENS,
-                    'is_stream': "True"}
-
-    llm = ChatOCIGenAI(
-    model_id=LLM_MODEL,
-    service_endpoint=llm_endpoint,
+with st.sidebar:
+    sidebar_controls()
+    chat_stats = st.empty()  # filled by chat_area(), which the sidebar fragment does not rerun
+
+@st.cache_resource(max_entries=32)
+def get_llm(model_id, service_endpoint, compartment_id, temperature, top_p, top_k, max_tokens):
+    """One warm streaming chat model per model, endpoint and parameters, shared by all sessions."""
+    model_kwargs = {'temperature': temperature,
+                    'top_p': top_p,
+                    'top_k': top_k,
+                    'max_tokens': max_tokens}
+
+    return ChatOCIGenAI(
+    model_id=model_id,
+    service_endpoint=service_endpoint,
     compartment_id=compartment_id,
+    client=get_inference_client(service_endpoint), # pooled client, see common/clients.py
+    is_stream=True, # tokens are passed to the callbacks as they arrive
     model_kwargs=model_kwargs
 )
 
+def init_llm(model_id):
+    """Returns the shared chat model for the sampling parameters from the sidebar."""
+    return get_llm(model_id, llm_endpoint, compartment_id, setting("temperature"), setting("top_p"),
+                   setting("top_k"), setting("max_tokens"))
+
+def init_memory(llm):
+    """Returns this session's conversation memory, rebuilt only when the memory settings change."""
+    mode = setting("memory_mode")
+    settings = (mode, setting("memory_window") if mode == "Window" else setting("memory_tokens"))
+    if st.session_state.get("memory_settings") != settings:
+        if mode == "Window":
+            memory = ConversationBufferWindowMemory(k=settings[1], ai_prefix="Assistant")
+        else:
+            # Older turns are summarized by the same model on a background thread
+            memory = TokenBudgetMemory(summarize=lambda prompt: llm.invoke(prompt).content,
+                                       max_tokens=settings[1], ai_prefix="Assistant")
+        st.session_state.chat_memory = memory
+        st.session_state.memory_settings = settings
+    return st.session_state.chat_memory
 
+# Initialize the ConversationChain
+def init_conversationchain():
+    """Wraps the shared model and this session's memory; cheap enough to rebuild on every save."""
+    llm = init_llm(setting("llm_model"))
     conversation = ConversationChain(
         llm=llm,
         verbose=True,
-        memory=ConversationBufferWindowMemory(k=MEMORY_WINDOW, ai_prefix="Assistant"),
+        memory=init_memory(llm),
         prompt=CLAUDE_PROMPT,
     )
 
@@ -146,41 +230,151 @@ def init_conversationchain():
 #initialize conversation chain
 if "conv_chain" not in st.session_state:  # Check if conv_chain exists in session state
     st.session_state["conv_chain"] = init_conversationchain()
-conv_chain = st.session_state["conv_chain"]
 
 
-def generate_response(conversation, input_text):
-    human_message = HumanMessage(content=input_text)
-    ai_response = conversation.run(input_text) # Get the full response directly
-    return ai_response
+def generate_response(conversation, input_text, placeholder):
+    """Streams the response into the placeholder; the chain still updates its memory.
+
+    Temperature 0 answers are looked up in the response cache first. Returns
+    the answer, the stream handler and whether the answer came from the cache.
+    """
+    handler = TokenStreamHandler(lambda text: placeholder.markdown(text.replace("#", "\\#") + "▌"))
+    llm = conversation.llm
+    key = None
+    if is_deterministic(llm.model_kwargs):
+        history = conversation.memory.load_memory_variables({})["history"]
+        key = response_key(llm.model_id, llm.model_kwargs, CLAUDE_PROMPT.format(history=history, input=input_text))
+        cached = get_response_cache().get(key)
+        if cached is not None:
+            conversation.memory.save_context({"input": input_text}, {"response": cached})
+            placeholder.markdown(cached.replace("#", "\\#"))
+            return cached, handler, True
+    ai_response = conversation.run(input_text, callbacks=[handler])
+    placeholder.markdown(ai_response.replace("#", "\\#"))
+    if key is not None and ai_response:
+        get_response_cache().set(key, ai_response)
+    return ai_response, handler, False
 
 
 if "messages" not in st.session_state:
-    st.session_state.messages = [INIT_MESSAGE]
-    conv_chain = init_conversationchain()
-
-# Display chat messages
-for message in st.session_state.messages:
+    st.session_state.messages = [dict(INIT_MESSAGE)]
+
+def compare_caption(answer):
+    if answer["error"]:
+        return f"Failed after {answer['total']:.2f}s: {answer['error']}"
+    ttft = f"first token after {answer['ttft']:.2f}s, " if answer["ttft"] is not None else ""
+    return f"{ttft}complete after {answer['total']:.2f}s, {answer['output_tokens']} output tokens"
+
+
+def message_markdown(message):
+    """Escaped markdown of a message, computed once and kept with the message."""
+    if "markdown" not in message:
+        message["markdown"] = message["content"].replace("#", "\\#")
+    return message["markdown"]
+
+
+def render_comparison(answers):
+    """Shows the answers of a comparison side by side."""
+    for column, answer in zip(st.columns(len(answers)), answers):
+        with column:
+            st.markdown(f"**{answer['model']}**")
+            st.markdown(message_markdown(answer))
+            st.caption(compare_caption(answer))
+
+
+def generate_comparison(input_text, models):
+    """Streams one prompt to all models concurrently, each into its own column."""
+    history = st.session_state["conv_chain"].memory.load_memory_variables({})["history"]
+    prompt = CLAUDE_PROMPT.format(history=history, input=input_text)
+    answers = {model: {"model": model, "content": "", "ttft": None, "total": None, "error": None}
+               for model in models}
+    placeholders = {}
+    captions = {}
+    for column, model in zip(st.columns(len(models)), models):
+        with column:
+            st.markdown(f"**{model}**")
+            placeholders[model] = st.empty()
+            placeholders[model].markdown("_Thinking..._")
+            captions[model] = st.empty()
+    # Total wait is the slowest model's time, not the sum
+    for model, text, result in stream_compare({model: init_llm(model) for model in models}, prompt):
+        if result is None:
+            placeholders[model].markdown(text.replace("#", "\\#") + "▌")
+            continue
+        answers[model].update(result, content=text, output_tokens=count_tokens(text))
+        placeholders[model].markdown(text.replace("#", "\\#"))
+        captions[model].caption(compare_caption(answers[model]))
+        if result["ttft"] is not None:
+            st.session_state.setdefault("ttft", {}).setdefault(model, []).append(result["ttft"])
+    return [answers[model] for model in models]
+
+
+def render_message(message):
     avatar = AVATAR_MAPPING.get(message["role"], "o.png")  # Default to "o.png" if not found
     with st.chat_message(message["role"], avatar=avatar):
+        if "comparison" in message:
+            render_comparison(message["comparison"])
+            return
         #st.markdown(message["content"])
-        st.markdown(message["content"].replace("#", "\\#"))
-
-
-# User input
-if user_input := st.chat_input("Type your message here..."):
-    st.session_state.messages.append({"role": "user", "content": user_input})
-    with st.chat_message("user", avatar=":material/record_voice_over:"):
-        st.markdown(user_input)
-        #st.markdown(user_input.replace("#", "\\#"))
-
-    #Display a spinner while waiting for the response
-    with st.spinner("Thinking..."):
-        full_response = generate_response(conv_chain, user_input)
-        
-
-    #display agent response
-    st.session_state.messages.append({"role": "assistant", "content": full_response})
-    with st.chat_message("assistant", avatar="o.png"):
-        #st.markdown(full_response)
-        st.markdown(full_response.replace("#", "\\#"))
+        st.markdown(message_markdown(message))
+        if message.get("cached"):
+            st.caption(":material/bolt: From the response cache")
+
+
+@st.fragment
+def chat_area():
+    """Messages added since the last full run, and the input box.
+
+    Sending a message reruns only this fragment, so the sidebar, the chain and
+    the earlier transcript are not rebuilt for every message. The sidebar stats
+    that change with each message are redrawn here.
+    """
+    conv_chain = st.session_state["conv_chain"]
+    live = st.container()  # keeps new messages above the input box
+    with live:
+        for message in st.session_state.messages[st.session_state.rendered_upto:]:
+            render_message(message)
+
+    # User input
+    if user_input := st.chat_input("Type your message here..."):
+        with live:
+            st.session_state.messages.append({"role": "user", "content": user_input})
+            with st.chat_message("user", avatar=":material/record_voice_over:"):
+                st.markdown(user_input)
+                #st.markdown(user_input.replace("#", "\\#"))
+
+            if setting("compare") and setting("compare_models"):
+                with st.chat_message("assistant", avatar="o.png"):
+                    answers = generate_comparison(user_input, setting("compare_models"))
+                st.session_state.messages.append({"role": "assistant", "content": "", "comparison": answers})
+            else:
+                #display agent response as it streams in
+                with st.chat_message("assistant", avatar="o.png"):
+                    response_placeholder = st.empty()
+                    response_placeholder.markdown("_Thinking..._")
+                    full_response, handler, cached = generate_response(conv_chain, user_input, response_placeholder)
+                    if cached:
+                        st.caption(":material/bolt: From the response cache")
+                    elif handler.ttft is not None:
+                        st.caption(f"First token after {handler.ttft:.2f}s, complete after {handler.total:.2f}s")
+                st.session_state.messages.append({"role": "assistant", "content": full_response, "cached": cached})
+
+                # Keep time to first token per model for the sidebar
+                if handler.ttft is not None:
+                    st.session_state.setdefault("ttft", {}).setdefault(conv_chain.llm.model_id, []).append(handler.ttft)
+
+    with chat_stats.container():
+        render_chat_stats()
+
+    if len(st.session_state.messages) - st.session_state.rendered_upto >= LIVE_MESSAGES:
+        # A fragment rerun clears and redraws everything it drew before; a full
+        # run takes these messages into the transcript so they stop being redrawn
+        st.rerun()
+
+
+# Display chat messages; a full run renders the whole transcript once
+for message in st.session_state.messages:
+    render_message(message)
+st.session_state.rendered_upto = len(st.session_state.messages)
+
+chat_area()
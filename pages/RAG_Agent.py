@@ -1,34 +1,20 @@
 # UI imports
 import streamlit as st
-from urllib.parse import urlparse, unquote 
-import datetime
-import pytz
-from datetime import timedelta
-import random
-import time
 
 # OCI-related imports
 import oci
-from oci.config import from_file
-from oci.object_storage import ObjectStorageClient
-from oci.object_storage.models import CreatePreauthenticatedRequestDetails
-import genai_agent_service_bmc_python_client 
-
-# LangChain-related imports
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.prompts.prompt import PromptTemplate
-from langchain.memory.chat_message_histories import StreamlitChatMessageHistory
-from langchain_community.chat_models.oci_generative_ai import ChatOCIGenAI
+from common.agent_router import get_router
+from common.citations import get_par_cache, parse_object_url
+from common.clients import get_agent_runtime_client, get_object_storage_client, pool_stats
 
 
 # OCI Configuration
 CONFIG_PROFILE = "DEFAULT" #DEFAULT or PUBSEC06
-config = oci.config.from_file()
 endpoint = st.secrets["endpoint"]
 #agent_endpoint_id = st.secrets["agent_endpoint_2"]
 compartment_id = st.secrets["compartment_id"]
-object_storage_client = ObjectStorageClient(config)
+# Pooled clients shared by all pages and sessions, see common/clients.py
+object_storage_client = get_object_storage_client()
 
 
 if st.session_state.get("page", "RAG") != st.session_state.current_page:
@@ -46,6 +32,9 @@ AVATAR_MAPPING = {
     "assistant": "o.png"
 }
 
+# Messages a fragment redraws before a full run takes them into the transcript
+LIVE_MESSAGES = 6
+
 with st.sidebar:
     
     if st.button("Reset Chat", type="primary", use_container_width=True, help="Reset chat history and clear screen"):
@@ -58,18 +47,21 @@ with st.sidebar:
     st.info("This RAG agent is designed to answer questions related to the documents in its knowledge base of Oracle Cloud services and US Federal Government policies and guidance. If there is no reference it can pull from, it will tell you it can not answer the question.")
     st.info('Try asking "What is m-21-31?"')
 
+    agent_options = {}
+    for key, value in st.secrets.items():
+        if key.startswith("agent_endpoint_"): 
+            display_name = key.replace("agent_endpoint_", "").replace("_", " ").title()
+            agent_options[display_name] = value 
+
+    # New chats go to the healthiest endpoint, see common/agent_router.py
+    router = get_router(get_agent_runtime_client(endpoint), agent_options,
+                        idle_timeout=st.secrets.get("agent_session_idle_timeout", 3600))
+    agent_display_names = list(agent_options.keys())
+    if "selected_display_name" not in st.session_state:
+        st.session_state.selected_display_name = router.choose()
+
     on = st.toggle("Show Agent Endpoint", value=True)
     if on:
-        agent_options = {}
-        for key, value in st.secrets.items():
-            if key.startswith("agent_endpoint_"): 
-                display_name = key.replace("agent_endpoint_", "").replace("_", " ").title()
-                agent_options[display_name] = value 
-                
-        agent_display_names = list(agent_options.keys())
-        if "selected_display_name" not in st.session_state:
-            st.session_state.selected_display_name = random.choice(agent_display_names) #set to 0 for static
-         
         selected_display_name = st.selectbox(
             "Choose Agent Endpoint:",
             agent_display_names,
@@ -79,7 +71,13 @@ with st.sidebar:
         # Update selected_display_name in session state
         st.session_state.selected_display_name = selected_display_name
 
-        agent_endpoint_id = agent_options[selected_display_name]
+        with st.expander("Endpoint Health"):
+            st.dataframe(router.stats(), hide_index=True)
+
+    agent_endpoint_id = agent_options[st.session_state.selected_display_name]
+
+    with st.expander("Connection Pools"):
+        st.dataframe(pool_stats(), hide_index=True)
 
 st.header("Oracle GenAI Agent Chat")
 st.subheader("Powered by Oracle Generative AI Agents (Beta)")
@@ -91,134 +89,111 @@ if "messages" not in st.session_state:
 if "session_id" not in st.session_state:
     st.session_state.session_id = None
 
-# Create GenAI Agent Runtime Client (only if session_id is None)
+# Sessions are handed out pre-created by the endpoint's pool, see common/agent_sessions.py
 if st.session_state.session_id is None:
-    genai_agent_runtime_client = genai_agent_service_bmc_python_client.GenerativeAiAgentRuntimeClient(
-        config=config,
-        service_endpoint=endpoint,
-        retry_strategy=oci.retry.NoneRetryStrategy(),
-        timeout=(10, 240)
-    )
-
-    # Create session
-    create_session_details = genai_agent_service_bmc_python_client.models.CreateSessionDetails(
-        display_name="display_name", idle_timeout_in_seconds=10, description="description"
-    )
-    create_session_response = genai_agent_runtime_client.create_session(create_session_details, agent_endpoint_id)
+    st.session_state.agent_session = router.acquire(st.session_state.selected_display_name)
     
     # Store session ID
-    st.session_state.session_id = create_session_response.data.id
+    st.session_state.session_id = st.session_state.agent_session.id
 
     # Check if welcome message exists and append to message history
-    if hasattr(create_session_response.data, 'welcome_message'):
-        st.session_state.messages.append({"role": "assistant", "content": create_session_response.data.welcome_message})
-
-# Display chat messages
-for message in st.session_state.messages:
+    if st.session_state.agent_session.welcome_message:
+        st.session_state.messages.append({"role": "assistant", "content": st.session_state.agent_session.welcome_message})
+elif st.session_state.agent_session.agent_endpoint_id != agent_endpoint_id:
+    # Another endpoint was chosen in the sidebar; continue the chat there
+    st.session_state.agent_session = router.acquire(st.session_state.selected_display_name)
+    st.session_state.session_id = st.session_state.agent_session.id
+
+def render_message(message):
     avatar = AVATAR_MAPPING.get(message["role"], "o.png")  # Default to "o.png" if not found
     with st.chat_message(message["role"], avatar=avatar):
         st.markdown(message["content"])
 
-# Get user input
-if user_input := st.chat_input("Type your message here..."):
-    st.session_state.messages.append({"role": "user", "content": user_input})
-    with st.chat_message("user", avatar=":material/record_voice_over:"):
-        st.markdown(user_input)
-
-    # Execute session (re-use the existing session)
-    genai_agent_runtime_client = genai_agent_service_bmc_python_client.GenerativeAiAgentRuntimeClient(
-            config=config, 
-            service_endpoint=endpoint,
-            retry_strategy=oci.retry.NoneRetryStrategy(), 
-            timeout=(10, 240)
-        )
-    # Display a spinner while waiting for the response
-    with st.spinner("Working..."):  # Spinner for visual feedback 
-        execute_session_details = genai_agent_service_bmc_python_client.models.ExecuteSessionDetails(
-        user_message=str(user_input), should_stream=False  # You can set this to True for streaming responses
-     )
-        execute_session_response = genai_agent_runtime_client.execute_session(agent_endpoint_id, st.session_state.session_id, execute_session_details)
-       
-    # # Display agent response
-    # if execute_session_response.status == 200:
-    #     response_content = execute_session_response.data.message.content
-    #     st.session_state.messages.append({"role": "assistant", "content": response_content.text})
-    #     with st.chat_message("assistant", avatar="o.png"):
-    #         st.markdown(response_content.text)
-    
-    # Display agent response in chunks to simulate streaming
-    # Thanks to saileshan.x.subhakaran@oracle.com for this 
-    if execute_session_response.status == 200:
-        response_content = execute_session_response.data.message.content
-        response_parts = response_content.text.split(' ')  # Split response into words for simulation
-        displayed_response = ""
-        response_placeholder = st.empty()
-        for part in response_parts:
-            displayed_response += part + ' '
-            response_placeholder.markdown(displayed_response)
-            time.sleep(0.025)  # Adjust delay as needed
-        st.session_state.messages.append({"role": "assistant", "content": response_content.text})
-
-    #  # Display citations with direct URLs - not recommended but OK if your bucket is public 
-    # if response_content.citations:
-    #     with st.expander("Citations"):
-    #         for i, citation in enumerate(response_content.citations, start=1):
-    #             st.write(f"**Citation {i}:**")
-
-    #             # Extract the path after '/o/' and decode
-    #             parsed_url = urlparse(citation.source_location.url)
-    #             path_parts = parsed_url.path.split("/o/")  
-    #             if len(path_parts) > 1:
-    #                 display_path = unquote(path_parts[1])
-    #             else:
-    #                 display_path = parsed_url.netloc  # Fallback to domain if '/o/' not found
-
-    #             # Use Markdown for a cleaner link presentation
-    #             st.markdown(f"**Source:** [{display_path}]({citation.source_location.url})") 
-
-    # Display citations with PAR URLs
-    if response_content.citations:
-        with st.expander("Citations"):
-            for i, citation in enumerate(response_content.citations, start=1):
-                st.write(f"**Citation {i}:**")
-
-                parsed_url = urlparse(citation.source_location.url)
-                path_parts = parsed_url.path.split("/")
-                # print(citation.source_location.url)
-                if len(path_parts) >= 5 and path_parts[1] == "n" and path_parts[3] == "b":
-                    namespace_name = path_parts[2]
-                    bucket_name = path_parts[4]
-                    object_name = citation.source_location.url.split("o/")[-1]
-                    display_path = object_name 
-
-                    # Generate PAR URL
-                    try:
-                        par_details = CreatePreauthenticatedRequestDetails(
-                            name=f"Download_{object_name}",
-                            access_type="ObjectRead",
-                            time_expires=datetime.datetime.now(pytz.timezone('UTC')) + timedelta(minutes=5), # 5 minute expiry, adjust as necessary for your security needs
-                            object_name=object_name
-                        )
-                        par = object_storage_client.create_preauthenticated_request(
-                            namespace_name,
-                            bucket_name,
-                            par_details
-                        )
-
-                        object_storage_endpoint = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                        
-                        par_url = object_storage_endpoint + par.data.access_uri
-
-                        st.markdown(f"**Source:** [{display_path}]({par_url})")  
-                    except Exception as e:
-                        st.error(f"Failed to generate PAR URL for {display_path}: {e}")
-                else:  
-                    st.markdown(f"**Source:** [{citation.source_location.url}]({citation.source_location.url})")
-                    st.error(f"Citation {i} does not reference a valid object storage URL.")
-
-
-                st.text_area("Citation Text", value=citation.source_text, height=200)
-
-
-    else:
-        st.error(f"API request failed with status: {execute_session_response.status}")
+# Display chat messages; a full run renders the whole transcript once
+for message in st.session_state.messages:
+    render_message(message)
+st.session_state.rendered_upto = len(st.session_state.messages)
+
+def render_citations(citations, key_prefix):
+    """Renders citations with PAR links in an expander."""
+    # PARs are deduplicated, cached and created concurrently, see common/citations.py
+    par_urls = get_par_cache().resolve([citation.url for citation in citations])
+    with st.expander("Citations"):
+        for i, citation in enumerate(citations, start=1):
+            st.write(f"**Citation {i}:**")
+
+            location = parse_object_url(citation.url)
+            if location:
+                display_path = location.object_name
+                par_url = par_urls[citation.url]
+                if isinstance(par_url, Exception):
+                    st.error(f"Failed to generate PAR URL for {display_path}: {par_url}")
+                else:
+                    st.markdown(f"**Source:** [{display_path}]({par_url})")  
+            else:  
+                st.markdown(f"**Source:** [{citation.url}]({citation.url})")
+                st.error(f"Citation {i} does not reference a valid object storage URL.")
+
+
+            st.text_area("Citation Text", value=citation.source_text, height=200, key=f"{key_prefix}_{i}")
+
+@st.fragment
+def chat_area():
+    """Messages added since the last full run, and the input box.
+
+    Sending a message reruns only this fragment; the sidebar, the endpoint
+    checks and the earlier transcript are left as they are.
+    """
+    live = st.container()  # keeps new messages above the input box
+    with live:
+        for message in st.session_state.messages[st.session_state.rendered_upto:]:
+            render_message(message)
+
+    # Get user input
+    if user_input := st.chat_input("Type your message here..."):
+        with live:
+            st.session_state.messages.append({"role": "user", "content": user_input})
+            with st.chat_message("user", avatar=":material/record_voice_over:"):
+                st.markdown(user_input)
+
+
+            # Stream the agent response into the chat as it is generated
+            with st.chat_message("assistant", avatar=AVATAR_MAPPING["assistant"]):
+                response_placeholder = st.empty()
+                citations_placeholder = st.empty()
+                response_placeholder.markdown("_Working..._")
+                response_text = ""
+                citation_renders = 0
+                stats = {}
+                try:
+                    # Re-uses the chat's session, replacing it if it expired and failing over if the endpoint errors
+                    for delta, citations in router.execute(st.session_state.agent_session, user_input, stats):
+                        if delta:
+                            response_text += delta
+                            response_placeholder.markdown(response_text + "▌")
+                        if citations:
+                            # Citations can be delivered more than once; show the latest set
+                            citation_renders += 1
+                            with citations_placeholder.container():
+                                render_citations(citations, key_prefix=f"citation_{len(st.session_state.messages)}_{citation_renders}")
+                    response_placeholder.markdown(response_text)
+                    st.session_state.messages.append({"role": "assistant", "content": response_text})
+                    print(f"Agent time to first token: {stats.get('ttft', 0):.2f}s, total: {stats['total']:.2f}s")
+                    st.caption(f"First token after {stats.get('ttft', 0):.2f}s, complete after {stats['total']:.2f}s")
+                    chosen = router.name_for(st.session_state.agent_session.agent_endpoint_id)
+                    if chosen != st.session_state.selected_display_name:
+                        # The message failed over; rerun the whole page so the sidebar shows the new endpoint and its stats
+                        st.session_state.selected_display_name = chosen
+                        st.session_state.session_id = st.session_state.agent_session.id
+                        st.rerun()
+                except oci.exceptions.ServiceError as e:
+                    response_placeholder.empty()
+                    st.error(f"API request failed with status: {e.status}")
+
+    if len(st.session_state.messages) - st.session_state.rendered_upto >= LIVE_MESSAGES:
+        # A fragment rerun clears and redraws everything it drew before; a full
+        # run takes these messages into the transcript so they stop being redrawn
+        st.rerun()
+
+
+chat_area()
@@ -1,9 +1,22 @@
+import concurrent.futures
+import ijson
 import json
+import shutil
+import subprocess
+import tempfile
 import time
 import oci
 import os
 import streamlit as st
-import tiktoken
+from common.bucket_index import get_bucket_index
+from common.fingerprints import FingerprintIndex, fingerprint
+from common.clients import get_object_storage_client, get_speech_client, pool_stats
+from common.jobs import TERMINAL_STATES, get_job_tracker
+from common.segments import SEGMENT_SECONDS, ffmpeg_available, probe_duration, split_audio, stitch_segments
+from common.summarize import SummaryError
+from common.pipeline import SUMMARY_INSTRUCTION, Pipeline, summary_object_name, transcript_object_name
+from common.transcripts import format_transcript, iter_tokens
+from common.uploads import upload_stream
 
 ## IDEA FOR NEW FEATURE - GENERATE SUMMARY PAGE
 # Choose from existing transcripts on object storage
@@ -11,17 +24,7 @@ import tiktoken
 
 #summary_instruction = st.secrets["instruction"] 
 
-summary_instruction = """Summarize this transcript with both an overview and detailed bullet points. Start with an overview in a couple of sentences. After that use bullet points to provide plenty of detail. Your response should be 1-2 pages long. 
-
-Example output: 
-## Overview
-Short overview of the entire transcript. This is 2-3 sentences long. 
-## Details
-- Detail of discussion 1
-- Detail of discussion 2 
-- Detail of discussion 3 
-... and so on
-"""
+summary_instruction = SUMMARY_INSTRUCTION
 
 # Define your Object Storage details
 compartment_id = st.secrets["compartment_id"]
@@ -43,125 +46,27 @@ llm_ocid = command_plus
 # Speech configuration
 model_type = "WHISPER_MEDIUM"  # or "WHISPER_MEDIUM" or "ORACLE"
 language_code = "en"  # "en-US" for ORACLE "en" for whisper
+batch_job_size = 10  # files transcribed together in one job when several are uploaded
 
 # Clients
-config = oci.config.from_file(profile_name="DEFAULT")
-object_storage_client = oci.object_storage.ObjectStorageClient(config)
-ai_speech_client = oci.ai_speech.AIServiceSpeechClient(config)
-
-def chunk_transcript(transcript, chunk_size=3000, model_name="cl100k_base"):
-    st.toast("Estimating tokens and chunking transcript accordingly")
-    try:
-        encoding = tiktoken.get_encoding(model_name)  # Correct way to get encoding
-    except ValueError:
-        encoding = tiktoken.get_encoding("cl100k_base")  # Fallback
-        print(f"Warning: Model '{model_name}' not found. Using 'cl100k_base'.")
-
-    tokens = encoding.encode(transcript)
-    chunks = []
-    for i in range(0, len(tokens), chunk_size):
-        chunk = encoding.decode(tokens[i:i + chunk_size])
-        chunks.append(chunk)
-    return chunks
+# Pooled clients shared by all pages and sessions, see common/clients.py
+object_storage_client = get_object_storage_client()
+ai_speech_client = get_speech_client()
+# Jobs are polled in the background and survive reruns and reconnects, see common/jobs.py
+job_tracker = get_job_tracker(ai_speech_client, st.secrets.get("job_registry_path", ".cache/transcription_jobs.json"))
+# Recordings that were transcribed before are looked up by content hash, see common/fingerprints.py
+fingerprint_index = FingerprintIndex(object_storage_client, namespace_name, bucket_name)
+
+@st.cache_resource
+def get_pipeline():
+    """Summarize and transcribe steps shared with the command line, see common/pipeline.py."""
+    return Pipeline(st.secrets, object_storage_client, ai_speech_client)
 
 def generate_summary(transcript, summary_instruction):
-  chunks = chunk_transcript(transcript)
-  st.toast("Generating summary with OCI Generative AI")
-  summaries = []
-  for chunk in chunks:
-    instruction_text = summary_instruction
-    endpoint = st.secrets["llm_endpoint"]
-    generative_ai_inference_client = oci.generative_ai_inference.GenerativeAiInferenceClient(config=config, service_endpoint=endpoint,
-    retry_strategy=oci.retry.NoneRetryStrategy(), timeout=(10,240))
-    chat_detail = oci.generative_ai_inference.models.ChatDetails()
-    chat_request = oci.generative_ai_inference.models.CohereChatRequest()
-    chat_request.message = instruction_text + chunk
-    chat_request.temperature = 0
-    chat_request.frequency_penalty = 0
-    chat_request.top_p = 0.75
-    chat_request.top_k = 0
-    chat_request.max_tokens = 2000
-    chat_detail.serving_mode = oci.generative_ai_inference.models.OnDemandServingMode(model_id=llm_ocid) #command-r-plus
-    chat_detail.chat_request = chat_request
-    chat_detail.compartment_id = compartment_id
-    chat_response = generative_ai_inference_client.chat(chat_detail)
-    try: 
-        summary = chat_response.data.chat_response.text
-        summaries.append(summary) #append the summary of each chunk
-    except (AttributeError, KeyError) as e:
-            print(f"Error processing response: {e}")
-            summaries.append(f"Error: {e}") #append the error to the list
-            continue #continue to the next chunk
-    final_summary = " ".join(summaries) #combine the summaries
-   # Remove duplicate "## Details" (keeping the first one)
-    first_details_index = final_summary.find("## Details")
-    if first_details_index != -1:
-        remaining_text = final_summary[first_details_index + len("## Details"):]
-        second_details_index = remaining_text.find("## Details")
-        while second_details_index != -1:
-            remaining_text = remaining_text[:second_details_index] + remaining_text[second_details_index + len("## Details"):]
-            second_details_index = remaining_text.find("## Details")
-        final_summary = final_summary[:first_details_index + len("## Details")] + remaining_text
-
-    # **Summarize the combined summary:**
-    final_instruction = """Please provide a concise summary of the following text: 
-    Example output: 
-            ## Overview
-            Short overview of the entire text. This is 2-3 sentences long. 
-            ## Details
-            - Detail of discussion 1
-            - Detail of discussion 2 
-            - Detail of discussion 3 
-            ... and so on
-            """ + final_summary
-    chat_request_final = oci.generative_ai_inference.models.CohereChatRequest()
-    chat_request_final.message = final_instruction
-    chat_request_final.temperature = 0
-    chat_request_final.frequency_penalty = 0
-    chat_request_final.top_p = 0.75
-    chat_request_final.top_k = 0
-    chat_request_final.max_tokens = 2000 # Reduced for the final summary
-    chat_detail_final = oci.generative_ai_inference.models.ChatDetails()
-    chat_detail_final.serving_mode = oci.generative_ai_inference.models.OnDemandServingMode(model_id=llm_ocid) #command-r-plus
-    chat_detail_final.chat_request = chat_request_final
-    chat_detail_final.compartment_id = compartment_id
-    chat_response_final = generative_ai_inference_client.chat(chat_detail_final)
+    st.toast("Chunking transcript and generating summary with OCI Generative AI")
+    # Chunks are summarized concurrently and reduced in a tree, see common/summarize.py
+    return get_pipeline().summarize([transcript], summary_instruction)
 
-    try:
-        final_summary = chat_response_final.data.chat_response.text
-        return final_summary
-    except (AttributeError, KeyError) as e:
-        print(f"Error processing final summary response: {e}")
-        return f"Error: {e}"
-  return final_summary
-
-def upload_summary_to_object_storage(summary_result, audio_file):
-    """Uploads the summary to object storage."""
-    summary_object_name = (
-        final_prefix + "/" + audio_file.split("/")[-1] + "summary" + ".txt"
-    )
-    object_storage_url = f"https://objectstorage.{region}.oraclecloud.com/n/{namespace_name}/b/{bucket_name}/o/{summary_object_name}"
-    try:
-        summary_bytes = summary_result.encode('utf-8', errors='replace')
-        object_storage_client.put_object(
-            namespace_name=namespace_name,
-            bucket_name=bucket_name,
-            object_name=summary_object_name,
-            put_object_body=summary_bytes
-        )
-        st.toast("Processing complete")
-        st.session_state.debug_info.update({
-        "Summary file name Object Storage": summary_object_name,
-        "Object Storage URL": object_storage_url,
-        "Summary Status": "Ready for user!"
-        })
-        return summary_object_name, object_storage_url
-    except oci.exceptions.ServiceError as e:
-        st.session_state.debug_info.update({
-        "Error uploading summary": e,
-    })
-        return None, None
-    
 def delete_objects_with_prefix(prefix):
     """Deletes objects from object storage based on prefix."""
     try:
@@ -184,181 +89,283 @@ def delete_objects_with_prefix(prefix):
             {f"Error deleting objects with prefix {prefix}": e}
         )
 
-def upload_audio_file(audio_file):
-    """Uploads an audio file to Object Storage."""
-    audio_upload_name = input_prefix + "/" + audio_file.name
-    object_storage_client.put_object(
-        namespace_name=namespace_name,
-        bucket_name=bucket_name,
-        object_name=audio_upload_name,
-        put_object_body=audio_file.read(),  # Use read() to get the file content
-    )
-    st.toast("Successfully uploaded input file to Object Storage")
-    return audio_upload_name
-
-def create_speech_job(audio_upload_name, filename): 
-    """Creates a speech transcription job."""
-    st.toast("Starting transcription process for: " + filename)  
-    create_transcription_job_response = ai_speech_client.create_transcription_job(
-        create_transcription_job_details=oci.ai_speech.models.CreateTranscriptionJobDetails(
-            compartment_id=compartment_id,
-            input_location=oci.ai_speech.models.ObjectListInlineInputLocation(
-                location_type="OBJECT_LIST_INLINE_INPUT_LOCATION",
-                object_locations=[
-                    oci.ai_speech.models.ObjectLocation(
-                        namespace_name=namespace_name,
-                        bucket_name=bucket_name,
-                        object_names=[audio_upload_name],
-                    )
-                ],
-            ),
-            output_location=oci.ai_speech.models.OutputLocation(
-                namespace_name=namespace_name,
-                bucket_name=bucket_name,
-                prefix=output_prefix,
-            ),
-            #display_name=filename,
-            model_details=oci.ai_speech.models.TranscriptionModelDetails(
-                domain="GENERIC",
-                model_type=model_type,
-                language_code=language_code,
-                transcription_settings=oci.ai_speech.models.TranscriptionSettings(
-                    diarization=oci.ai_speech.models.Diarization(
-                        is_diarization_enabled=True
-                    )
-                ),
-            ),
+def upload_audio_files(audio_files):
+    """Uploads audio files to Object Storage concurrently, each in parallel parts if it is large."""
+    def upload(audio_file):
+        audio_upload_name = input_prefix + "/" + audio_file.name
+        upload_stats = upload_stream(
+            object_storage_client,
+            namespace_name,
+            bucket_name,
+            audio_upload_name,
+            audio_file,  # read part by part instead of audio_file.read()
+            size=audio_file.size,
         )
-    )
+        return audio_upload_name, upload_stats
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        uploaded = list(executor.map(upload, audio_files))
+    seconds = time.perf_counter() - start  # wall time of the whole upload, the files overlap
+    st.toast(f"Successfully uploaded {len(uploaded)} input file(s) to Object Storage")
+    total_bytes = sum(upload_stats["bytes"] for _, upload_stats in uploaded)
+    st.session_state.debug_info.update({
+        "Upload size (MB)": round(total_bytes / 1024 / 1024, 1),
+        "Upload parts": sum(upload_stats["parts"] for _, upload_stats in uploaded),
+        "Upload time (s)": round(seconds, 2),
+        "Upload throughput (MB/s)": round(total_bytes / 1024 / 1024 / seconds, 2) if seconds else None,
+    })
+    return [audio_upload_name for audio_upload_name, _ in uploaded]
+
+def upload_segments(audio_file):
+    """Splits a long recording into overlapping segments and uploads them.
+
+    Returns `[(offset_seconds, object_name)]`, or None when the recording is
+    short enough to transcribe in one job.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_path = os.path.join(tmp_dir, audio_file.name)
+        with open(local_path, "wb") as f:
+            shutil.copyfileobj(audio_file, f, 16 * 1024 * 1024)
+        audio_file.seek(0)
+        try:
+            duration = probe_duration(local_path)
+        except (subprocess.CalledProcessError, ValueError, KeyError) as e:
+            # Let the Speech service judge the file; it reports unsupported formats per job
+            print(f"Could not read the duration of {audio_file.name}: {e}")
+            st.toast(f"Could not read the length of {audio_file.name}, uploading it without splitting")
+            return None
+        if duration < SEGMENT_SECONDS * 1.5:
+            return None
+        st.toast("Splitting recording into segments")
+        segments = split_audio(local_path, tmp_dir)
+
+        def upload(segment):
+            offset, segment_path = segment
+            segment_name = input_prefix + "/" + os.path.basename(segment_path)
+            with open(segment_path, "rb") as f:
+                upload_stream(object_storage_client, namespace_name, bucket_name, segment_name, f,
+                              size=os.path.getsize(segment_path))
+            return offset, segment_name
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            uploaded = list(executor.map(upload, segments))
+    st.toast(f"Successfully uploaded {len(uploaded)} segments to Object Storage")
+    st.session_state.debug_info.update({
+        "Segments": len(uploaded)
+    })
+    return uploaded
 
-    job_id = create_transcription_job_response.data.id
-    out_loc = create_transcription_job_response.data.output_location.prefix
+def create_speech_job(audio_upload_names, filename): 
+    """Creates a speech transcription job for one or more uploaded objects."""
+    st.toast("Starting transcription process for: " + filename)  
+    job_id, out_loc = get_pipeline().create_transcription_job(audio_upload_names, model_type, language_code)
     st.session_state.debug_info.update({
         "Job ID": job_id,
         "Location": out_loc
     })
     return job_id, out_loc
 
-def wait_for_job_completion(job_id, out_loc):
-    """Waits for a speech transcription job to complete,
-    updating the timer every second."""
-
-    start_time = time.time()
-    last_api_call_time = time.time()  # Initialize last API call time
-
-    # Use st.empty to create placeholders for the UI elements
-    status_container = st.empty()
+def track_speech_job(job_id, out_loc, objects):
+    """Registers a job with the tracker together with the recordings its objects belong to."""
+    job_tracker.track(job_id, out_loc=out_loc, objects=objects)
+    return job_id
+
+def recording_parts(jobs):
+    """Groups the objects of all jobs by recording: {source_name: [(job, object), ...]}."""
+    recordings = {}
+    for job in jobs:
+        for obj in job["objects"]:
+            recordings.setdefault(obj["source_name"], []).append((job, obj))
+    return recordings
+
+def part_progress(job, obj):
+    """Returns (state, percent) for one object of a job, using the task state for batch jobs."""
+    for task in job.get("tasks") or []:
+        if task["name"].split("/")[-1] == obj["object_name"].split("/")[-1]:
+            return task["state"], task["percent_complete"]
+    return job["state"], job["percent_complete"] or 0
+
+@st.fragment(run_every=2)
+def show_job_progress(job_ids):
+    """Shows the per-file status without blocking; reruns the page once all jobs are done."""
+    jobs = [job_tracker.status(job_id) for job_id in job_ids]
+    if all(job["state"] in TERMINAL_STATES for job in jobs):
+        st.rerun()
+    rows = []
+    for parts in recording_parts(jobs).values():
+        progress = [part_progress(job, obj) for job, obj in parts]
+        states = {state for state, _ in progress}
+        if len(states) == 1:
+            state = states.pop()
+        elif states & {"FAILED", "CANCELED"}:
+            state = "FAILED"
+        else:
+            state = "IN_PROGRESS"
+        rows.append({
+            "File": parts[0][1]["filename"],
+            "Status": state,
+            "Progress": sum(percent for _, percent in progress) // len(progress),
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True, column_config={
+        "Progress": st.column_config.ProgressColumn("Progress", min_value=0, max_value=100, format="%d%%"),
+    })
+    elapsed_time = time.time() - min(job["created"] for job in jobs)
+    minutes = int(elapsed_time // 60)
+    seconds = int(elapsed_time % 60)
     time_container = st.empty()
-    
-    status = None
+    time_container.metric("Elapsed time", f"{minutes:02d}:{seconds:02d}")  # Use st.metric for time
 
-    while True:
-        try:
-            # Make API call every 10 seconds
-            if time.time() - last_api_call_time >= 5:
-                get_transcription_job_response = ai_speech_client.get_transcription_job(
-                    transcription_job_id=job_id
-                )
-                status = get_transcription_job_response.data.lifecycle_state
-                status_container.write(f"Status: {status}")  # Use st.header for status
-                last_api_call_time = time.time()  # Update last API call time
-
-            if status == "SUCCEEDED":
-                #st.toast(f"Transcription time:", f"{minutes:02d}:{seconds:02d}")
-                break
-
-            # Update timer every second
-            elapsed_time = time.time() - start_time
-            minutes = int(elapsed_time // 60)
-            seconds = int(elapsed_time % 60)
-            time_container.metric("Elapsed time", f"{minutes:02d}:{seconds:02d}")  # Use st.metric for time
-            time.sleep(1)  # Sleep for 1 second
-
-        except oci.exceptions.ServiceError as e:
-            st.error(f"An error occurred: {e}")
-            break
-
-    ori_name = (
-        get_transcription_job_response.data.input_location.object_locations[0]
-        .object_names[0]
-    )
+def speech_json_name(job, ori_name):
+    """Returns the name of the speech JSON output for one of the job's input objects."""
+    return get_pipeline().speech_json_name(job["out_loc"], ori_name)
 
-    res_file = (
-        out_loc
-        + namespace_name
-        + "_"
-        + bucket_name
-        + "_"
-        + ori_name
-        + ".json"
+def open_speech_json(res_file):
+    """Opens one speech JSON output in Object Storage as a binary stream."""
+    get_object_response = object_storage_client.get_object(
+        namespace_name=namespace_name,
+        bucket_name=bucket_name,
+        object_name=res_file,
     )
-    st.session_state.debug_info.update({
-        "Uploaded file: ": ori_name,
-        "Speech JSON file: ": res_file.split("/")[-1]
-    })
-    return res_file
+    stream = get_object_response.data.raw
+    stream.decode_content = True
+    return stream
 
-def download_speech_json(res_file):
-    """Downloads the transcript from Object Storage."""
-    st.toast("Fetching speech json output")
+def fetch_speech_json(res_file):
+    """Reads one speech JSON output from Object Storage (safe to call from worker threads)."""
     get_object_response = object_storage_client.get_object(
         namespace_name=namespace_name,
         bucket_name=bucket_name,
         http_response_content_type="text/plain",
         object_name=res_file,
     )
-    json_data = json.loads(get_object_response.data.content)
-    st.session_state.debug_info.update({
-        "Get JSON from Object Storage": "OK"
-    })
-  
-    return json_data
-
-def create_transcript(json_data):
-    """Creates a formatted transcript from JSON data."""
-    st.toast("Formatting transcript from raw json")
-    transcript = ""
-    # Check if 'transcriptions' exists in json_data
-    if isinstance(json_data.get("transcriptions"), list) and len(json_data["transcriptions"]) > 0:
-        for entry in json_data["transcriptions"][0]["tokens"]:
-            text = entry["token"]
-            # if current_speaker != speaker_index:
-            #     speaker_name = speaker1_name if speaker_index == 0 else speaker2_name
-            #     transcript += f"\n\n{speaker_name}: {text} "
-            #     current_speaker = speaker_index
-            # else:
-            transcript += f"{text} "
-        st.session_state.debug_info.update({
-        "Clean up transcipt": "OK"
-    })
-    return transcript
-
-def upload_transcript_to_object_storage(transcript, audio_file, model_type):
-    """Uploads the transcript to object storage."""
-    st.toast("Uploading formatted transcript to object storage")
-    transcript_object_name = (
-        final_prefix + "/" + audio_file.split("/")[-1] + model_type + ".txt"
-    )
-    object_storage_url = f"https://objectstorage.{region}.oraclecloud.com/n/{namespace_name}/b/{bucket_name}/o/{transcript_object_name}"
+    return json.loads(get_object_response.data.content)
+
+def put_text_object(object_name, text):
+    """Writes a text object to Object Storage and returns its URL."""
+    url = get_pipeline().put_text(object_name, text)
+    # Let the document pickers see the new object
+    get_bucket_index(object_storage_client, namespace_name, bucket_name, final_prefix + "/",
+                     ttl=st.secrets.get("bucket_index_ttl_seconds", 60)).invalidate(object_name)
+    return url
+
+def read_text_object(object_name):
+    """Reads a text object from Object Storage, or returns None if it does not exist."""
     try:
-        transcript_bytes = transcript.encode('utf-8', errors='replace')
-        object_storage_client.put_object(
-            namespace_name=namespace_name,
-            bucket_name=bucket_name,
-            object_name=transcript_object_name,
-            put_object_body=transcript_bytes,
-        )
-        st.session_state.debug_info.update({
-        "Transcript file name Object Storage": transcript_object_name,
-        "Object Storage URL": object_storage_url,
-        "Transcript Status": "Ready for user!"
-        })
-        return transcript_object_name, object_storage_url
+        response = object_storage_client.get_object(namespace_name, bucket_name, object_name)
     except oci.exceptions.ServiceError as e:
-        st.session_state.debug_info.update({
-        "Error uploading transcript": e,
+        if e.status != 404:
+            raise
+        return None
+    return response.data.content.decode('utf-8', errors='replace')
+
+def reuse_transcription(filename, key):
+    """Returns the stored result of an earlier transcription of the same recording, or None."""
+    entry = fingerprint_index.get(key)
+    if entry is None:
+        return None
+    try:
+        transcript = read_text_object(entry["transcript_object_name"])
+        summary = read_text_object(entry["summary_object_name"]) if entry.get("summary_object_name") else None
+    except oci.exceptions.ServiceError as e:
+        print(f"Error reading stored transcript for {filename}: {e}")
+        return None
+    if not transcript:
+        return None
+    result = {
+        "filename": filename,
+        "source_name": entry["source_name"],
+        "transcript": transcript,
+        "transcript_object_name": entry["transcript_object_name"],
+        "object_storage_url": f"https://objectstorage.{region}.oraclecloud.com/n/{namespace_name}/b/{bucket_name}/o/{entry['transcript_object_name']}",
+        "speech_outputs": entry.get("speech_outputs", []),
+        "fingerprint": key,
+        "cached": True,
+        "error": None,
+    }
+    if summary:
+        result["summary"] = summary
+        result["summary_object_name"] = entry["summary_object_name"]
+    return result
+
+def record_fingerprints(results):
+    """Points the fingerprint index at the transcript, summary and speech output of each recording."""
+    for result in results:
+        if result.get("fingerprint") and not result["error"]:
+            fingerprint_index.put(result["fingerprint"], {
+                "source_name": result["source_name"],
+                "transcript_object_name": result["transcript_object_name"],
+                "summary_object_name": result.get("summary_object_name"),
+                "speech_outputs": result.get("speech_outputs", []),
+                "model_type": model_type,
+                "language_code": language_code,
+            })
+
+def add_summaries(results):
+    """Generates and uploads a summary for every transcript that does not have one yet."""
+    for result in results:
+        if not result["transcript"] or "summary" in result:
+            continue
+        try:
+            summary = generate_summary(result["transcript"], summary_instruction) # Pass summary_instruction here
+        except SummaryError as e:
+            st.error(f"Could not summarize {result['filename']}: {e}")
+            continue
+        if summary:
+            summary_name = summary_object_name(result["source_name"])
+            try:
+                put_text_object(summary_name, summary)
+                result["summary"] = summary
+                result["summary_object_name"] = summary_name
+            except oci.exceptions.ServiceError as e:
+                st.session_state.debug_info.update({
+                "Error uploading summary": e,
+            })
+
+def process_recording(source_name, parts):
+    """Downloads, stitches, formats and uploads the transcript of one recording.
+
+    Runs on a worker thread, so it only talks to Object Storage and returns
+    the result instead of touching the Streamlit session.
+    """
+    filename = parts[0][1]["filename"]
+    speech_outputs = [speech_json_name(job, obj["object_name"]) for job, obj in parts]
+    try:
+        if len(parts) == 1:
+            # Parse the output as it downloads, one token at a time
+            job, obj = parts[0]
+            with open_speech_json(speech_outputs[0]) as stream:
+                transcript = format_transcript(iter_tokens(stream))
+        else:
+            outputs = [(obj["offset"], fetch_speech_json(res_file))
+                       for (job, obj), res_file in zip(parts, speech_outputs)]
+            transcript = format_transcript(stitch_segments(outputs)["transcriptions"][0]["tokens"])
+        transcript_name = transcript_object_name(source_name, model_type)
+        object_storage_url = put_text_object(transcript_name, transcript) if transcript else None
+    except (oci.exceptions.ServiceError, ijson.JSONError, ValueError) as e:
+        return {"filename": filename, "source_name": source_name, "transcript": "", "error": str(e)}
+    return {
+        "filename": filename,
+        "source_name": source_name,
+        "transcript": transcript,
+        "transcript_object_name": transcript_name,
+        "object_storage_url": object_storage_url,
+        "speech_outputs": speech_outputs,
+        "fingerprint": parts[0][1].get("fingerprint"),
+        "error": None if transcript else "The transcription is empty",
+    }
+
+def process_recordings(jobs):
+    """Formats the transcripts of all recordings concurrently, in upload order."""
+    st.toast("Fetching speech json output and formatting transcripts")
+    recordings = recording_parts(jobs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda item: process_recording(*item), recordings.items()))
+    st.session_state.debug_info.update({
+        "Transcripts": sum(1 for result in results if not result["error"]),
+        "Failed transcripts": sum(1 for result in results if result["error"]),
     })
-        return None, None
+    return results
 
 # Streamlit UI
 st.set_page_config(page_title="OWL", 
@@ -372,18 +379,26 @@ st.session_state.debug_info = {"Session State": "OK",}
 if "submitted" not in st.session_state:
     st.session_state.submitted = False
 
+# Pick running jobs back up after a reconnect (the job IDs are kept in the URL)
+if "job_ids" not in st.session_state and "job" in st.query_params:
+    st.session_state.job_ids = st.query_params["job"].split(",")
+    st.session_state.submitted = True
+
 st.header("Oracle Workspace Listen (OWL)")
 st.subheader("Powered by Oracle Speech and Generative AI")
-st.info("Upload any audio or video file and then click transcribe.")
+st.info("Upload one or more audio or video files and then click transcribe.")
 
 with st.sidebar:
     st.info("Oracle Workspace Listen (OWL) is envisioned as an internal tool that utilizes Oracle Cloud Platform services to accept an audio file as input and return to the user a full transcript and, optionally, a short summarization.")
     st.info("When using OWL, your data stays within your Oracle Cloud Tenancy. This means that data privacy is assured through our best-in-class security capabilities and your confidential data is never shared with third parties.")
     if st.button("Clear Session", type="primary", use_container_width=True, help="Remove the existing file, clear session, and start over."):
         st.session_state.clear()
+        st.query_params.clear()
         st.session_state.submitted = False
         st.toast("Session cleared! You can now upload a new file.")
         st.rerun()
+    with st.expander("Connection Pools"):
+        st.dataframe(pool_stats(), hide_index=True)
     # with st.expander("Admin Controls"):
     #     if st.button("Clear All Files", help="Clear all files from object storage.", type="primary", use_container_width=True,):
     #         # delete_objects_with_prefix(input_prefix + "/") 
@@ -404,86 +419,145 @@ with st.sidebar:
 file_uploader_placeholder = st.empty()
 transcribe_button_placeholder = st.empty()
 summary_checkbox_placeholder = st.empty()
+segments_checkbox_placeholder = st.empty()
 create_summary = True
+split_segments = False
 
 if not st.session_state.submitted: 
-    uploaded_file = file_uploader_placeholder.file_uploader("Upload an audio or video file and then click transcribe.", 
+    uploaded_files = file_uploader_placeholder.file_uploader("Upload audio or video files and then click transcribe.", 
+    accept_multiple_files=True,
     help="Allowed file types: aac, ac3, amr, au, flac, m4a, mkv, mp3, mp4, oga, ogg, wav, webm")
-    if transcribe_button_placeholder.button("Transcribe",type="primary",help="This will take about 3-4 minutes for a 20 minute recording.", use_container_width = True) and uploaded_file is not None:
+    if transcribe_button_placeholder.button("Transcribe",type="primary",help="This will take about 3-4 minutes for a 20 minute recording.", use_container_width = True) and uploaded_files:
         st.session_state.submitted = True
-        filename = uploaded_file.name
         st.session_state.debug_info.update({
-            "Starting transcription job for": filename
+            "Starting transcription job for": ", ".join(uploaded_file.name for uploaded_file in uploaded_files)
         })
     if summary_checkbox_placeholder.checkbox("Generate Summary", help="Check this box to also generate a summary.", value=True ):
         create_summary = True
         st.session_state.debug_info.update({
             "Generate Short Summary": "True"
         })
+    split_segments = segments_checkbox_placeholder.checkbox(
+        "Transcribe long recordings in parallel segments",
+        value=ffmpeg_available(), disabled=not ffmpeg_available(),
+        help=f"Recordings longer than {SEGMENT_SECONDS * 1.5 / 60:.0f} minutes are split into {SEGMENT_SECONDS // 60} minute segments that are transcribed at the same time. Requires ffmpeg on the server.")
 
 if st.session_state.submitted:
     # Clear the placeholders to remove the elements from the UI
     file_uploader_placeholder.empty()
     transcribe_button_placeholder.empty()
     summary_checkbox_placeholder.empty() 
-
-if st.session_state.submitted and "transcript" not in st.session_state:
-    with st.spinner("Transcribing..."):
-        audio_upload_name = upload_audio_file(uploaded_file)
-        filename = uploaded_file.name 
-        job_id, out_loc = create_speech_job(audio_upload_name, filename)
-        res_file = wait_for_job_completion(job_id, out_loc)
-        json_data = download_speech_json(res_file)
-        transcript = create_transcript(json_data)
-        st.session_state.transcript = transcript
-
-        if transcript:
-            (
-                transcript_object_name,
-                object_storage_url,
-            ) = upload_transcript_to_object_storage(
-                transcript, audio_upload_name, model_type
-            )
-            st.session_state.transcript_object_name = transcript_object_name  
+    segments_checkbox_placeholder.empty()
+
+if st.session_state.submitted and "job_ids" not in st.session_state:
+    with st.spinner("Uploading..."):
+        job_ids = []
+        whole_files = []
+        reused = []
+        fingerprints = {}  # file ID -> fingerprint; several uploads can share a filename
+        for uploaded_file in uploaded_files:
+            filename = uploaded_file.name
+            # Skip the upload and the Speech job for recordings we transcribed before
+            key = fingerprint(uploaded_file, model_type, language_code)
+            result = reuse_transcription(filename, key)
+            if result:
+                reused.append(result)
+                continue
+            fingerprints[uploaded_file.file_id] = key
+            segments = upload_segments(uploaded_file) if split_segments else None
+            if not segments:
+                whole_files.append(uploaded_file)
+                continue
+            # One job per segment; the jobs run at the same time
+            for offset, segment_name in segments:
+                job_id, out_loc = create_speech_job([segment_name], filename)
+                job_ids.append(track_speech_job(job_id, out_loc, [{
+                    "object_name": segment_name, "source_name": input_prefix + "/" + filename,
+                    "offset": offset, "filename": filename, "fingerprint": key,
+                }]))
+        audio_upload_names = upload_audio_files(whole_files) if whole_files else []
+        # Whole files are transcribed in batches, up to batch_job_size objects per job
+        for start in range(0, len(whole_files), batch_job_size):
+            batch_files = whole_files[start:start + batch_job_size]
+            batch_names = audio_upload_names[start:start + batch_job_size]
+            label = batch_files[0].name if len(batch_files) == 1 else f"{len(batch_files)} files"
+            job_id, out_loc = create_speech_job(batch_names, label)
+            job_ids.append(track_speech_job(job_id, out_loc, [
+                {"object_name": name, "source_name": name, "offset": 0, "filename": batch_file.name,
+                 "fingerprint": fingerprints[batch_file.file_id]}
+                for name, batch_file in zip(batch_names, batch_files)
+            ]))
+        if reused:
+            st.toast(f"Reused {len(reused)} earlier transcript(s) without a new transcription job")
+            st.session_state.debug_info.update({
+                "Reused transcripts": len(reused)
+            })
+        st.session_state.reused_results = reused
+        st.session_state.job_ids = job_ids
+        if job_ids:
+            st.query_params["job"] = ",".join(job_ids)
+
+if "job_ids" in st.session_state and "results" not in st.session_state:
+    jobs = [job_tracker.status(job_id) for job_id in st.session_state.job_ids]
+    if not jobs:
+        # Every recording was transcribed before
+        results = st.session_state.reused_results
+        if create_summary:
+            with st.spinner("Summarizing..."):
+                add_summaries(results)
+        record_fingerprints(results)
+        st.session_state.results = results
+    elif None in jobs:
+        st.error("This transcription job is no longer tracked. Clear the session and upload the files again.")
+    elif any(job["state"] not in TERMINAL_STATES for job in jobs):
+        show_job_progress(st.session_state.job_ids)
+    else:
+        for job in jobs:
+            if job["state"] != "SUCCEEDED":
+                st.error(f"Transcription job {job['state'].lower()}: {job['error']}")
+        with st.spinner("Transcribing..."):
+            # Files of failed jobs report their own error below
+            results = st.session_state.get("reused_results", []) + process_recordings(jobs)
             if create_summary:
-                summary = generate_summary(st.session_state.transcript, summary_instruction) # Pass summary_instruction here
-                if summary:
-                    (
-                        summary_object_name,
-                        summary_object_url,
-                    ) = upload_summary_to_object_storage(
-                        summary, audio_upload_name
-                    )
-                    st.session_state.summary_object_name = summary_object_name
-                    st.session_state.summary = summary
-
-
-if "transcript" in st.session_state and st.session_state.transcript:
+                add_summaries(results)
+                st.toast("Processing complete")
+            record_fingerprints(results)
+            st.session_state.results = results
+
+if "results" in st.session_state and "job" in st.query_params:
+    # The transcripts are written; a reload starts over instead of picking the finished job up again
+    del st.query_params["job"]
+
+
+for index, result in enumerate(st.session_state.get("results", [])):
+    if len(st.session_state.results) > 1:
+        st.subheader(result["filename"])
+    if result["error"]:
+        st.error(f"Could not transcribe {result['filename']}: {result['error']}")
+        continue
+    if result.get("cached"):
+        st.caption("This recording was transcribed before, so the stored transcript was reused.")
     st.download_button(
         label="Download Transcript",
         type="primary",
         use_container_width= True,
-        data=st.session_state.transcript,
-        file_name=st.session_state.transcript_object_name,
+        data=result["transcript"],
+        file_name=result["transcript_object_name"],
         mime="text/plain",
-        key="download_transcript" 
+        key=f"download_transcript_{index}" 
     )
-    if not create_summary and "summary_object_name" not in st.session_state:
-        with st.expander("Show Transcript"):
-            st.text_area("Transcript", value=st.session_state.transcript, height=300)
-
-
-    if create_summary and "summary_object_name" in st.session_state:
+    if "summary_object_name" in result:
         st.download_button(
             label="Download Summary",
             use_container_width= True,
             type="primary",
-            data=st.session_state.summary,
-            file_name=st.session_state.summary_object_name,
+            data=result["summary"],
+            file_name=result["summary_object_name"],
             mime="text/plain",
-            key="download_summary"
+            key=f"download_summary_{index}"
         )
-        with st.expander("Show Transcript"):
-            st.text_area("Transcript", value=st.session_state.transcript, height=300)
+    with st.expander("Show Transcript"):
+        st.text_area("Transcript", value=result["transcript"], height=300, key=f"transcript_{index}")
+    if "summary" in result:
         with st.expander("Show Summary"):
-            st.markdown(st.session_state.summary)
\ No newline at end of file
+            st.markdown(result["summary"])
@@ -1,8 +1,13 @@
 import streamlit as st
 import oci
 import json
-import PyPDF2
-import tiktoken
+from common.bucket_index import get_bucket_index
+from common.object_cache import build_object_cache
+from common.pdf_text import iter_pdf_pages
+from common.clients import get_object_storage_client, get_speech_client, pool_stats
+from common.pipeline import Pipeline
+from common.summarize import SummaryError
+from common.summary_cache import get_disk_cache
 
 if st.session_state.get("page", "Summary") != st.session_state.current_page:
     # Clear all session state data
@@ -37,95 +42,33 @@ llama32 = st.secrets["llama32_ocid"]
 llama31 = st.secrets["llama31_ocid"]
 llm_ocid = command_plus
 
-config = oci.config.from_file(profile_name="DEFAULT")
-object_storage_client = oci.object_storage.ObjectStorageClient(config)
-ai_speech_client = oci.ai_speech.AIServiceSpeechClient(config)
+# Pooled clients shared by all pages and sessions, see common/clients.py
+object_storage_client = get_object_storage_client()
+ai_speech_client = get_speech_client()
+# Transcripts and summaries listed once and shared by all sessions, see common/bucket_index.py
+transcript_index = get_bucket_index(object_storage_client, namespace_name, bucket_name, final_prefix + "/",
+                                    ttl=st.secrets.get("bucket_index_ttl_seconds", 60))
 
-def chunk_transcript(transcript, chunk_size=3000, model_name="cl100k_base"):
-    """Chunks a transcript based on tokens (correctly)."""
-    try:
-        encoding = tiktoken.get_encoding(model_name)  # Correct way to get encoding
-    except ValueError:
-        encoding = tiktoken.get_encoding("cl100k_base")  # Fallback
-        print(f"Warning: Model '{model_name}' not found. Using 'cl100k_base'.")
-
-    tokens = encoding.encode(transcript)
-    chunks = []
-    for i in range(0, len(tokens), chunk_size):
-        chunk = encoding.decode(tokens[i:i + chunk_size])
-        chunks.append(chunk)
-    return chunks
+@st.cache_resource
+def get_pipeline():
+    """Summarize steps shared with the command line, see common/pipeline.py."""
+    return Pipeline(st.secrets, object_storage_client, ai_speech_client)
 
-def generate_summary(transcript, summary_instruction):
-  
-  chunks = chunk_transcript(transcript)
-  summaries = []
-  for chunk in chunks:
-    instruction_text = summary_instruction
-    endpoint = st.secrets["llm_endpoint"]
-    generative_ai_inference_client = oci.generative_ai_inference.GenerativeAiInferenceClient(config=config, service_endpoint=endpoint,
-    retry_strategy=oci.retry.NoneRetryStrategy(), timeout=(10,240))
-    chat_detail = oci.generative_ai_inference.models.ChatDetails()
-    chat_request = oci.generative_ai_inference.models.CohereChatRequest()
-    chat_request.message = instruction_text + chunk
-    chat_request.temperature = 0
-    chat_request.frequency_penalty = 0
-    chat_request.top_p = 0.75
-    chat_request.top_k = 0
-    chat_request.max_tokens = 2000
-    chat_detail.serving_mode = oci.generative_ai_inference.models.OnDemandServingMode(model_id=llm_ocid) #command-r-plus
-    chat_detail.chat_request = chat_request
-    chat_detail.compartment_id = compartment_id
-    chat_response = generative_ai_inference_client.chat(chat_detail)
-    try: 
-        summary = chat_response.data.chat_response.text
-        summaries.append(summary) #append the summary of each chunk
-    except (AttributeError, KeyError) as e:
-            print(f"Error processing response: {e}")
-            summaries.append(f"Error: {e}") #append the error to the list
-            continue #continue to the next chunk
-    final_summary = " ".join(summaries) #combine the summaries
-   # Remove duplicate "## Details" (keeping the first one)
-    first_details_index = final_summary.find("## Details")
-    if first_details_index != -1:
-        remaining_text = final_summary[first_details_index + len("## Details"):]
-        second_details_index = remaining_text.find("## Details")
-        while second_details_index != -1:
-            remaining_text = remaining_text[:second_details_index] + remaining_text[second_details_index + len("## Details"):]
-            second_details_index = remaining_text.find("## Details")
-        final_summary = final_summary[:first_details_index + len("## Details")] + remaining_text
+@st.cache_resource
+def get_object_cache():
+    """Transcript and summary contents shared by all sessions, revalidated by ETag."""
+    return build_object_cache(st.secrets, object_storage_client)
 
-    # **Summarize the combined summary:**
-    final_instruction = """Please provide a concise summary of the following text: 
-    Example output: 
-            ## Overview
-            Short overview of the entire text. This is 2-3 sentences long. 
-            ## Details
-            - Detail of discussion 1
-            - Detail of discussion 2 
-            - Detail of discussion 3 
-            ... and so on
-            """ + final_summary
-    chat_request_final = oci.generative_ai_inference.models.CohereChatRequest()
-    chat_request_final.message = final_instruction
-    chat_request_final.temperature = 0
-    chat_request_final.frequency_penalty = 0
-    chat_request_final.top_p = 0.75
-    chat_request_final.top_k = 0
-    chat_request_final.max_tokens = 2000 # Reduced for the final summary
-    chat_detail_final = oci.generative_ai_inference.models.ChatDetails()
-    chat_detail_final.serving_mode = oci.generative_ai_inference.models.OnDemandServingMode(model_id=llm_ocid) #command-r-plus
-    chat_detail_final.chat_request = chat_request_final
-    chat_detail_final.compartment_id = compartment_id
-    chat_response_final = generative_ai_inference_client.chat(chat_detail_final)
+@st.cache_resource
+def get_pdf_page_cache():
+    """Extracted PDF pages keyed by file hash and page number, shared by all sessions."""
+    return get_disk_cache(st.secrets.get("pdf_page_cache_dir", ".cache/pdf_pages"),
+                          max_bytes=int(st.secrets.get("pdf_page_cache_max_mb", 128)) * 1024 * 1024)
 
-    try:
-        final_summary = chat_response_final.data.chat_response.text
-        return final_summary
-    except (AttributeError, KeyError) as e:
-        print(f"Error processing final summary response: {e}")
-        return f"Error: {e}"
-  return final_summary
+def generate_summary(texts, summary_instruction):
+    # Chunks are produced lazily as the texts arrive, then summarized concurrently
+    # and reduced in a tree, see common/summarize.py
+    return get_pipeline().summarize(texts, summary_instruction)
 
 
 def upload_summary_to_object_storage(summary_result, audio_file):
@@ -177,15 +120,17 @@ def delete_objects_with_prefix(prefix):
         )
 
 
+def picker_options(summaries):
+    """Maps file names to object names for the transcript or the summary picker."""
+    return {obj.name.split("/")[-1]: obj.name for obj in transcript_index.objects()
+            if obj.name.endswith(".txt") and ("summary" in obj.name) == summaries}
+
+
 def get_transcript_from_object_storage(object_name):
     """Fetches the transcript text from Object Storage."""
     try:
-        get_object_response = object_storage_client.get_object(
-            namespace_name=namespace_name,
-            bucket_name=bucket_name,
-            object_name=object_name
-        )
-        transcript = get_object_response.data.text
+        # Served from the local cache unless the object changed, see common/object_cache.py
+        transcript = get_object_cache().get_text(object_name)
         return transcript
     except oci.exceptions.ServiceError as e:
         st.error(f"Error fetching transcript: {e}")
@@ -195,14 +140,8 @@ def get_transcript_from_object_storage(object_name):
 def download_summary_text(res_file):
     """Downloads the summary text from Object Storage."""
     try:
-        get_object_response = object_storage_client.get_object(
-            namespace_name=namespace_name,
-            bucket_name=bucket_name,
-            object_name=res_file,  # Just the filename, no prefix
-        )
-
-        # Decode the content (important!):
-        summary_text = get_object_response.data.content.decode('utf-8')  # Or the correct encoding
+        # Conditional GET: a summary that did not change is read from the local cache
+        summary_text = get_object_cache().get_text(res_file)
 
         return summary_text
 
@@ -233,6 +172,11 @@ with st.sidebar:
         # selected_transcript = []
         st.toast("Session cleared! You can generate a new summary now.")
         st.rerun()
+    with st.expander("Connection Pools"):
+        st.dataframe(pool_stats(), hide_index=True)
+    with st.expander("Object Cache"):
+        for key, value in get_object_cache().stats().items():
+            st.write(f"{key}: {value}")
 
 file_uploader_placeholder = st.empty()
 object_storage_picker_placeholder = st.empty()
@@ -246,19 +190,13 @@ if not st.session_state.submitted:
 
     # Object Storage Transcript Selection
     with object_storage_picker_placeholder.expander("Summarize a transcript from Object Storage:", expanded=True):
-        try:
-            objects = object_storage_client.list_objects(
-                namespace_name=namespace_name,
-                bucket_name=bucket_name,
-                prefix=final_prefix + "/"  # Assuming transcripts are stored with this prefix
-            )
-            transcript_options = {obj.name.split("/")[-1]: obj.name for obj in objects.data.objects if obj.name.endswith(".txt") and "summary" not in obj.name}
-            selected_transcript = st.selectbox("Choose a transcript:", list(transcript_options.keys()), index=None, placeholder="Select a transcript...")
-        except oci.exceptions.ServiceError as e:
-            st.error(f"Error listing transcripts: {e}")
+        transcript_options = picker_options(summaries=False)
+        if transcript_index.error:
+            st.error(f"Error listing transcripts: {transcript_index.error}")
+        selected_transcript = st.selectbox("Choose a transcript:", list(transcript_options.keys()), index=None, placeholder="Select a transcript...")
 
 with summary_picker_placeholder.expander("Retrieve an existing summary from Object Storage:"):
-    summary_options = {obj.name.split("/")[-1]: obj.name  for obj in objects.data.objects if obj.name.endswith(".txt") and "summary" in obj.name}
+    summary_options = picker_options(summaries=True)
     selected_summary = st.selectbox("Select a summary to view:",  list(summary_options.keys()), index=None, placeholder="Select a summary...")
     if selected_summary != None:
         st.session_state.submitted = True
@@ -301,11 +239,8 @@ with summary_picker_placeholder.expander("Retrieve an existing summary from Obje
                 text_content = uploaded_file.read().decode("utf-8")
                 st.session_state.text_content = text_content
             elif uploaded_file.type == "application/pdf":
-                pdf_reader = PyPDF2.PdfReader(uploaded_file)
-                text_content = ""
-                for page in pdf_reader.pages:
-                    text_content += page.extract_text()
-                st.session_state.text_content = text_content
+                # Pages are extracted while the summary is generated, see below
+                st.session_state.pdf_bytes = uploaded_file.getvalue()
             else:
                 st.error("Unsupported file type. Please upload a text or PDF file.")
         elif selected_transcript:
@@ -322,11 +257,21 @@ if st.session_state.submitted:
 
     if "summary" not in st.session_state:
         with st.spinner("Generating Summary..."):
-            if "text_content" in st.session_state:
-                summary = generate_summary(st.session_state.text_content, summary_instruction)
-            else:
-                summary = generate_summary(st.session_state.transcript, summary_instruction)
-            st.session_state.summary = summary  # Store the summary in session state
+            try:
+                if "pdf_bytes" in st.session_state:
+                    # Pages stream from a process pool into the chunker, so early chunks are
+                    # summarized while later pages are still being extracted, see common/pdf_text.py
+                    pages = iter_pdf_pages(st.session_state.pdf_bytes, cache=get_pdf_page_cache())
+                    summary = generate_summary(pages, summary_instruction)
+                elif "text_content" in st.session_state:
+                    summary = generate_summary([st.session_state.text_content], summary_instruction)
+                else:
+                    summary = generate_summary([st.session_state.transcript], summary_instruction)
+                st.session_state.summary = summary  # Store the summary in session state
+            except SummaryError as e:
+                # Chunks that did succeed are cached, so trying again only resends the rest
+                st.error(f"Could not generate the summary, please try again: {e}")
+                st.session_state.submitted = False
 
 
 # Display Summary
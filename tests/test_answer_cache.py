@@ -0,0 +1,52 @@
+from common.answer_cache import AnswerCache, normalize
+
+
+def cached(question, other):
+    cache = AnswerCache()
+    cache.set("agent", question, "answer", [])
+    return cache.get("agent", other)
+
+
+def test_normalize_keeps_identifiers():
+    assert normalize("What is section 3553(a)?") == "section 3553 a"
+    assert normalize("What is criminal history category I") == "criminal history category i"
+
+
+def test_rephrased_question_hits():
+    assert cached("What is VICAR?", "what does VICAR mean").match == "exact"
+    assert cached("What are the sentencing guidelines for fraud?",
+                  "what is the sentencing guideline for fraud").match == "approximate"
+
+
+def test_different_identifiers_miss():
+    assert cached("What is criminal history category I", "What is criminal history category II") is None
+    assert cached("sentencing for fraud over 1 million", "sentencing for fraud over 10 million") is None
+    assert cached("What is section 3553", "What is section 3553 b") is None
+    assert cached("What is section 3553(a)?", "What is section 3553(b)?") is None
+
+
+def test_different_words_miss():
+    assert cached("sentencing guidelines for wire fraud", "sentencing guidelines for mail fraud") is None
+
+
+def test_negated_questions_miss():
+    assert cached("When does the career offender enhancement apply?",
+                  "When does the career offender enhancement not apply?") is None
+    assert cached("Can a sentence be reduced for cooperation?",
+                  "Can't a sentence be reduced for cooperation?") is None
+    assert cached("Is supervised release required for drug offenses?",
+                  "Is supervised release required except for drug offenses?") is None
+
+
+def test_contrasting_questions_miss():
+    assert cached("Which amendments apply to offenses committed before November 2010?",
+                  "Which amendments apply to offenses committed after November 2010?") is None
+    assert cached("Sentencing range for loss amounts over the threshold",
+                  "Sentencing range for loss amounts under the threshold") is None
+    assert cached("Sentencing range for loss amounts over the threshold",
+                  "Sentencing range for loss amounts below the threshold") is None
+
+
+def test_same_negation_hits():
+    assert cached("When does the enhancement not apply?",
+                  "When doesn't the enhancement apply?") is not None
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from common import chunking
+from common.chunking import iter_chunks
+
+
+class WordEncoding:
+    """Counts words as tokens, so the tests do not need the tiktoken download."""
+
+    def encode(self, text):
+        return text.split(" ")
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr(chunking, "get_encoding", lambda model_name="cl100k_base": WordEncoding())
+
+
+def sentences(count, seed=0):
+    rng = random.Random(seed)
+    words = "the court held that a defendant who pleads guilty must be sentenced within the range unless".split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(5, 25))).capitalize() + "." for _ in range(count)]
+
+
+def test_chunks_respect_the_size_limit():
+    chunks = list(iter_chunks([" ".join(sentences(2000))], chunk_size=300))
+    assert len(chunks) > 10
+    assert all(len(chunk.split(" ")) <= 300 for chunk in chunks)
+
+
+def test_local_edit_changes_only_nearby_chunks():
+    original = sentences(2000)
+    before = set(iter_chunks([" ".join(original)], chunk_size=300))
+    rng = random.Random(1)
+    for _ in range(20):
+        edited = list(original)
+        index = rng.randrange(len(edited))
+        if rng.random() < 0.5:
+            edited[index] = "An edited sentence replaces the old one."
+        else:
+            del edited[index:index + 3]
+        after = list(iter_chunks([" ".join(edited)], chunk_size=300))
+        assert len(set(after) - before) <= 2
@@ -0,0 +1,39 @@
+import datetime
+import types
+
+from common.citations import ParCache, parse_object_url
+
+BASE = "https://objectstorage.us-ashburn-1.oraclecloud.com/n/ns/b/docs"
+
+
+def test_object_name_keeps_every_path_segment():
+    location = parse_object_url(BASE + "/o/docs/memo/file%20one.pdf")
+    assert location.namespace_name == "ns"
+    assert location.bucket_name == "docs"
+    assert location.object_name == "docs/memo/file one.pdf"
+
+
+def test_non_object_urls_are_rejected():
+    assert parse_object_url(BASE) is None
+    assert parse_object_url("https://example.com/policy.pdf") is None
+
+
+class FakeObjectStorage:
+    def create_preauthenticated_request(self, namespace_name, bucket_name, details):
+        return types.SimpleNamespace(data=types.SimpleNamespace(access_uri=f"/p/{details.object_name}"))
+
+
+def test_expired_pars_are_pruned():
+    cache = ParCache(FakeObjectStorage(), lifetime=datetime.timedelta(seconds=30))  # inside REUSE_MARGIN
+    cache.resolve([BASE + "/o/a.pdf", BASE + "/o/b.pdf"])
+    urls = cache.resolve([BASE + "/o/c.pdf"])
+    assert urls[BASE + "/o/c.pdf"].endswith("/p/c.pdf")
+    assert cache.created == 3 and cache.reused == 0
+    assert [location.object_name for location in cache._pars] == ["c.pdf"]
+
+
+def test_live_pars_are_reused():
+    cache = ParCache(FakeObjectStorage())
+    first = cache.resolve([BASE + "/o/a.pdf"])
+    assert cache.resolve([BASE + "/o/a.pdf"]) == first
+    assert cache.created == 1 and cache.reused == 1
@@ -0,0 +1,39 @@
+import types
+
+import oci
+
+from common.object_cache import ObjectCache
+from common.summary_cache import DiskLRUCache
+
+
+class FakeClient:
+    def __init__(self, text, etag):
+        self.text = text
+        self.etag = etag
+        self.requests = []
+
+    def get_object(self, namespace_name, bucket_name, object_name, if_none_match=None):
+        self.requests.append(if_none_match)
+        if if_none_match == self.etag:
+            raise oci.exceptions.ServiceError(304, "NotModified", {}, "Not Modified")
+        return types.SimpleNamespace(data=types.SimpleNamespace(content=self.text.encode("utf-8")),
+                                     headers={"etag": self.etag})
+
+
+def test_etag_survives_restart(tmp_path):
+    client = FakeClient("transcript", "etag-1")
+    assert ObjectCache(client, "ns", "bucket", DiskLRUCache(str(tmp_path))).get_text("a.json") == "transcript"
+
+    restarted = ObjectCache(client, "ns", "bucket", DiskLRUCache(str(tmp_path)))
+    assert restarted.get_text("a.json") == "transcript"
+    assert client.requests == [None, "etag-1"]
+    assert restarted.not_modified == 1 and restarted.downloads == 0
+
+
+def test_changed_object_replaces_entry(tmp_path):
+    client = FakeClient("old", "etag-1")
+    cache = ObjectCache(client, "ns", "bucket", DiskLRUCache(str(tmp_path)))
+    cache.get_text("a.json")
+    client.text, client.etag = "new", "etag-2"
+    assert cache.get_text("a.json") == "new"
+    assert len(cache.disk) == 1
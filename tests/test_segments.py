@@ -0,0 +1,38 @@
+from common.segments import stitch_segments
+
+
+def token(word, start, speaker):
+    return {"token": word, "startTime": f"{start}s", "endTime": f"{start + 0.4}s", "speakerIndex": speaker}
+
+
+def segment(tokens):
+    return {"transcriptions": [{"tokens": tokens}]}
+
+
+def speakers(stitched):
+    return {t["token"]: t["speakerIndex"] for t in stitched["transcriptions"][0]["tokens"]}
+
+
+def test_speaker_heard_in_overlap_keeps_label():
+    first = segment([token("hello", 1, 0), token("hi", 3, 1), token("shared", 601, 1)])
+    # The second job numbers the speakers the other way round
+    second = segment([token("shared", 1, 0), token("later", 20, 1), token("reply", 30, 0)])
+    labels = speakers(stitch_segments([(0, first), (600, second)]))
+    assert labels["reply"] == labels["hi"]
+    assert labels["later"] == labels["hello"]
+
+
+def test_speaker_silent_in_overlap_keeps_label():
+    # An hour-long two-person recording; "b" never talks in an overlap and
+    # every other job numbers the speakers the other way round
+    segments = []
+    for index in range(6):
+        a, b = index % 2, 1 - index % 2
+        tokens = [token(f"a{index}", 50, a), token(f"b{index}", 100, b), token(f"w{index}", 601, a)]
+        if index:
+            tokens.insert(0, token(f"w{index - 1}", 1, a))
+        segments.append((index * 600, segment(tokens)))
+    labels = speakers(stitch_segments(segments))
+    assert set(labels.values()) == {0, 1}
+    assert {labels[f"a{index}"] for index in range(6)} == {labels["a0"]}
+    assert {labels[f"b{index}"] for index in range(6)} == {labels["b0"]}
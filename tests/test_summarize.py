@@ -0,0 +1,35 @@
+import types
+
+import oci
+import pytest
+
+from common import summarize
+from common.summarize import SummaryError, map_reduce_summary
+
+
+class FakeClient:
+    def __init__(self, failures):
+        self.failures = list(failures)  # statuses to fail with, in order
+
+    def chat(self, chat_detail):
+        if self.failures:
+            raise oci.exceptions.ServiceError(self.failures.pop(0), "Error", {}, "failed")
+        text = types.SimpleNamespace(text="summary of " + chat_detail.chat_request.message[-1])
+        return types.SimpleNamespace(data=types.SimpleNamespace(chat_response=text))
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(summarize, "RETRY_DELAY", 0)
+
+
+def test_throttled_and_server_errors_are_retried():
+    client = FakeClient([429, 503])
+    assert map_reduce_summary(client, ["a", "b"], "", "model", "compartment") == "summary of b"
+
+
+def test_failed_request_raises_instead_of_reducing_error_text():
+    with pytest.raises(SummaryError):
+        map_reduce_summary(FakeClient([400]), ["a", "b"], "", "model", "compartment")
+    with pytest.raises(SummaryError):
+        map_reduce_summary(FakeClient([500] * summarize.MAX_ATTEMPTS), ["a"], "", "model", "compartment")